@@ -1,11 +1,21 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
+import sys
+
+# db_playstation2.idx не хранится в репозитории: как и build.py, собираем
+# индекс из JSON-баз перед анализом (то же делает python serial_index.py)
+sys.path.insert(0, SPECPATH)
+from config import DATABASE_FILES, INDEX_FILE_NAME
+from serial_index import write_index
+
+write_index([os.path.join(SPECPATH, name) for name in DATABASE_FILES], os.path.join(SPECPATH, INDEX_FILE_NAME))
 
 
 a = Analysis(
     ['gui.py'],
     pathex=[],
     binaries=[],
-    datas=[('db_playstation2_official_as.json', '.'), ('db_playstation2_official_au.json', '.'), ('db_playstation2_official_eu.json', '.'), ('db_playstation2_official_jp.json', '.'), ('db_playstation2_official_ko.json', '.'), ('db_playstation2_official_us.json', '.'), ('assets', 'assets'), ('assets/linux', 'linux'), ('assets/ps2gamesmanager.desktop', '.'), ('assets/ps2gamesmanager.png', '.')],
+    datas=[('db_playstation2.idx', '.'), ('assets', 'assets'), ('assets/linux', 'linux'), ('assets/ps2gamesmanager.desktop', '.'), ('assets/ps2gamesmanager.png', '.')],
     hiddenimports=['PIL._tkinter_finder', 'customtkinter', 'PIL._tkinter_finder', 'PIL._imaging', 'PIL._imagingft', 'PIL._imagingmath'],
     hookspath=[],
     hooksconfig={},
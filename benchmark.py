@@ -0,0 +1,848 @@
+"""Замеры производительности идентификации образов PS2.
+
+Примеры запуска:
+    python benchmark.py scan --size 256
+    python benchmark.py identify --images 32 --size 64 --jobs 1 4 16
+    python benchmark.py startup
+    python benchmark.py parsers --size 1G --files 200 --depth 4 --json > before.jsonl
+    python benchmark.py records --entries 5000
+    python benchmark.py latency --latency-ms 5 --concurrency 1 8 32 128
+    python benchmark.py http --size 4G
+    python benchmark.py udf-tags --files 500
+    python benchmark.py udf-mount
+    python benchmark.py udf-walk --files 2000
+    python benchmark.py udf-names --entries 50000
+    python benchmark.py disc-fs --files 200
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import posixpath
+import re
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import disc_fs
+import disc_io
+import identify_playstation2_games as ps2
+import iso9660
+import read_udf
+import serial_index
+import synthetic_disc
+from config import DATABASE_FILES
+from game_identifier import identify_games
+
+MB = 1024 * 1024
+
+
+def _legacy_find_in_binary(file_name):
+    """Прежний поиск: отдельный re.search на каждый префикс и новый bytes на блок"""
+    with open(file_name, 'rb') as f:
+        file_size = os.path.getsize(file_name)
+        while True:
+            rom_data = f.read(ps2.BUFFER_SIZE)
+            if not rom_data:
+                return None
+
+            for prefix in ps2.PREFIXES:
+                m = re.search(prefix + br"[-_][\d\.]+;", rom_data)
+                if m and m.group() and b'999.99' not in m.group():
+                    return m.group().replace(b'.', b'').replace(b'_', b'-').replace(b';', b'')
+
+            pos = f.tell()
+            if pos > 6 and pos < file_size:
+                f.seek(pos - 6)
+
+
+def _write_scan_image(path, size_mb, serial=b'SLUS_203.12;1'):
+    """Создает образ из случайных данных с серийником в самом конце"""
+    block = os.urandom(MB)
+    with open(path, 'wb') as f:
+        for _ in range(size_mb):
+            f.write(block)
+        f.seek(-len(serial), os.SEEK_END)
+        f.write(serial)
+
+
+def _best_time(func, path, repeat):
+    """Лучшее время из нескольких запусков и результат функции"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(path)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def bench_scan(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'scan.iso')
+        _write_scan_image(path, args.size)
+
+        full_scan = lambda path: ps2._find_in_binary(path, full_scan=True)[0]
+        for name, func in (('before', _legacy_find_in_binary), ('after', full_scan)):
+            elapsed, serial = _best_time(func, path, args.repeat)
+            print(f"{name:>7}: {args.size / elapsed:8.1f} MB/s  ({elapsed:.3f} s, {serial})")
+
+
+def bench_identify(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, 'CD')
+        os.mkdir(folder)
+        first = os.path.join(folder, 'image_000.iso')
+        _write_scan_image(first, args.size)
+        for index in range(1, args.images):
+            # Жесткие ссылки дешевле копий, а для поиска это разные файлы
+            os.link(first, os.path.join(folder, f'image_{index:03}.iso'))
+
+        for jobs in args.jobs:
+            progress = []
+            start = time.perf_counter()
+            games = identify_games(tmp, lambda message, tag: None, lambda done, total: progress.append(total),
+                                   cache=False, jobs=jobs, full_scan=True)
+            elapsed = time.perf_counter() - start
+            print(f"jobs={jobs:>3}: {args.images / elapsed:8.2f} images/s  "
+                  f"({args.images * args.size / elapsed:8.1f} MB/s, {len(games)} found, "
+                  f"всего при первом образе {progress[0]})")
+            # Обход опережает идентификацию: полоса прогресса не стоит на 100%
+            if args.images > 1 and progress[0] == 1:
+                raise SystemExit("Общее число образов растет вместе с обработанными")
+
+
+def _legacy_load_databases():
+    """Прежняя загрузка: json.load всех баз и перестройка словарей с ключами-bytes"""
+    dbs = {}
+    for db_file in DATABASE_FILES:
+        with open(ps2.get_resource_path(db_file), 'rb') as f:
+            db = json.loads(f.read().decode('utf8'))
+        dbs[db_file] = {key.encode('utf-8'): title for key, title in db.items()}
+    return dbs
+
+
+def _open_index_and_lookup():
+    index = serial_index.SerialIndex.from_file(ps2.INDEX_PATH)
+    return index.lookup(b'SLUS-20312')
+
+
+def bench_startup(args):
+    ps2._get_serial_index()  # индекс должен существовать до замеров
+
+    for name, func in (('json', _legacy_load_databases), ('index', _open_index_and_lookup)):
+        elapsed, _ = _best_time(lambda _: func(), None, args.repeat)
+        print(f"{name:>7}: {elapsed * 1000:8.2f} ms  загрузка баз и первый поиск")
+
+    command = [sys.executable, '-c', 'import identify_playstation2_games']
+    elapsed, _ = _best_time(lambda _: subprocess.run(command, check=True), None, args.repeat)
+    print(f" import: {elapsed * 1000:8.2f} ms  python -c 'import identify_playstation2_games'")
+
+
+def _full_scan(path):
+    return ps2._find_in_binary(path, full_scan=True)
+
+
+def _read_iso9660_system_cnf(path):
+    with disc_fs.open_disc(path) as disc:
+        return ps2._read_system_cnf(disc, 'iso9660')
+
+
+def _read_udf_system_cnf(path):
+    with disc_fs.open_disc(path) as disc:
+        try:
+            return ps2._read_system_cnf(disc, 'udf')
+        except IOError:
+            return None
+
+
+# Путь идентификации, функция и параметры синтетического образа для него
+PARSER_CASES = [
+    ('iso9660', _read_iso9660_system_cnf, {}),
+    ('udf', _read_udf_system_cnf, {'udf': True}),
+    ('iso9660-raw', _read_iso9660_system_cnf, {'raw': True}),
+    ('binary-start', ps2._find_in_binary, {'system_cnf': None, 'boot_file': False, 'serial_at': 'start'}),
+    ('binary-boundary', ps2._find_in_binary, {'system_cnf': None, 'boot_file': False, 'serial_at': 'boundary'}),
+    ('binary-middle', ps2._find_in_binary, {'system_cnf': None, 'boot_file': False, 'serial_at': 'middle'}),
+    ('binary-end', ps2._find_in_binary, {'system_cnf': None, 'boot_file': False, 'serial_at': 'end'}),
+    ('binary-end-full', _full_scan, {'system_cnf': None, 'boot_file': False, 'serial_at': 'end'}),
+    ('identify', ps2.get_playstation2_game_info, {'udf': True}),
+]
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_parsers(args):
+    """Замер каждого пути идентификации на синтетических разреженных образах.
+
+    Параметры образов фиксированы аргументами, поэтому результаты с --json
+    можно сохранить и сравнить между коммитами.
+    """
+    revision = _git_revision()
+    ps2._get_serial_index()  # сборка индекса не должна попасть в замер
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, func, options in PARSER_CASES:
+            if args.cases and name not in args.cases:
+                continue
+
+            path = os.path.join(tmp, f"{name}.{'bin' if options.get('raw') else 'iso'}")
+            image = synthetic_disc.write_image(
+                path, size=args.size, files=args.files, depth=args.depth, **options)
+            elapsed, result = _best_time(func, path, args.repeat)
+            os.remove(path)
+            # Поиск в сырых данных возвращает еще и число прочитанных байт
+            found, bytes_read = result if isinstance(result, tuple) else (result, None)
+
+            row = {
+                'case': name,
+                'revision': revision,
+                'size': image['size'],
+                'files': image['files'],
+                'depth': args.depth,
+                'seconds': elapsed,
+                'mb_per_s': image['size'] / MB / elapsed,
+                'images_per_s': 1 / elapsed,
+                'found': found is not None,
+                'bytes_read': bytes_read,
+            }
+            if args.json:
+                print(json.dumps(row))
+            else:
+                print(f"{name:>16}: {row['mb_per_s']:10.1f} MB/s  {row['images_per_s']:10.2f} images/s"
+                      f"  ({elapsed * 1000:.2f} ms"
+                      f"{'' if bytes_read is None else f', прочитано {bytes_read / MB:.1f} МБ'}"
+                      f"{'' if row['found'] else ', не найден'})")
+
+
+def _legacy_list_directory(cd, d):
+    """Прежний разбор каталога ISO9660: чтение по сектору, struct.calcsize и
+    struct.unpack на каждое поле, dict на запись и сразу отформатированная дата"""
+    def unpack(st):
+        st = st if st[0] in '<>' else '<' + st
+        return struct.unpack(st, cd._buff.read(struct.calcsize(st)))[0]
+
+    def unpack_both(st):
+        a = unpack('<' + st)
+        b = unpack('>' + st)
+        assert a == b
+        return a
+
+    def unpack_record(read):
+        l0 = unpack('B')
+        if l0 == 0:
+            return read + 1, None
+        unpack('B')
+        r = {}
+        r['ex_loc'] = unpack_both('I')
+        r['ex_len'] = unpack_both('I')
+        r['datetime'] = iso9660._dir_datetime(cd._buff.read(7))
+        r['flags'] = unpack('B')
+        r['interleave_unit_size'] = unpack('B')
+        r['interleave_gap_size'] = unpack('B')
+        r['volume_sequence'] = unpack_both('h')
+        l2 = unpack('B')
+        r['name'] = cd._buff.read(l2).rstrip(b' ').split(b';')[0]
+        if l2 % 2 == 0:
+            unpack('B')
+        extra = l0 - (34 + l2 - (l2 % 2))
+        if extra > 0:
+            cd._buff.read(extra)
+        return read + l0, r
+
+    sector = d['ex_loc']
+    cd._get_sector(sector, iso9660.SECTOR_SIZE)
+    read, r_self = unpack_record(0)
+    read, _ = unpack_record(read)
+    children = []
+    while read < r_self['ex_len']:
+        if read % iso9660.SECTOR_SIZE == 0:
+            sector += 1
+            cd._get_sector(sector, iso9660.SECTOR_SIZE)
+        read, r = unpack_record(read)
+        if r is None:
+            to_read = iso9660.SECTOR_SIZE - read % iso9660.SECTOR_SIZE
+            cd._buff.read(to_read)
+            read += to_read
+        else:
+            children.append(r)
+    return children
+
+
+def bench_records(args):
+    """Разбор большого каталога ISO9660: прежний dict-разбор против Struct/__slots__"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'records.iso')
+        synthetic_disc.write_image(path, files=args.entries, depth=0, file_size=0)
+        with iso9660.ISO9660(path) as cd:
+            cases = (
+                ('before', lambda _: _legacy_list_directory(cd, cd._root)),
+                ('after', lambda _: list(cd._unpack_dir_children(cd._root))),
+            )
+            for name, func in cases:
+                elapsed, children = _best_time(func, None, args.repeat)
+                print(f"{name:>7}: {len(children) / elapsed:12.0f} records/s  ({elapsed * 1000:.2f} ms)")
+
+        # Поиск файлов по полному пути: обход каталогов против индекса путей
+        paths = [b'/SYSTEM.CNF'] + [f'/F{i:05d}.BIN'.encode('ascii') for i in range(0, args.entries, 97)]
+        for name, index in (('walk', False), ('index', True)):
+            with iso9660.ISO9660(path, index=index) as cd:
+                start = time.perf_counter()
+                for file_path in paths:
+                    cd.get_record(file_path)
+                elapsed = time.perf_counter() - start
+                print(f"{name:>7}: {len(paths) / elapsed:12.0f} lookups/s  "
+                      f"({cd.cache_misses} чтений с диска, {cd.cache_hits} из кэша)")
+
+        check_mixed_case_lookup(tmp)
+
+
+def check_mixed_case_lookup(tmp):
+    """Файлы в каталоге, записанном не заглавными буквами, находятся по пути
+    в любом регистре - и обходом каталогов, и по индексу путей"""
+    path = os.path.join(tmp, 'mixed.iso')
+    synthetic_disc.write_image(path, files=6, depth=2, data_dir='Data', file_size=0)
+    paths = (b'/Data', b'/data/F00001.BIN', b'/DATA/F00001.BIN', b'/Data/l1/F00002.BIN')
+    for name, index in (('walk', False), ('index', True)):
+        missing = []
+        with iso9660.ISO9660(path, index=index) as cd:
+            for file_path in paths:
+                try:
+                    cd.get_record(file_path)
+                except iso9660.ISO9660IOError:
+                    missing.append(file_path)
+        print(f"{name:>7}: каталог Data, не найдено {len(missing)} из {len(paths)} путей")
+        if missing:
+            raise SystemExit(f"{name}: не найдены {missing}")
+
+
+def bench_latency(args):
+    """Опрос SYSTEM.CNF во многих образах на «медленном» хранилище с задержкой
+    на каждое чтение: пропускная способность в зависимости от параллелизма"""
+    read_system_cnf = _read_udf_system_cnf if args.udf else _read_iso9660_system_cnf
+
+    async def probe(paths, concurrency):
+        found = 0
+        async for _, result in disc_io.map_images(read_system_cnf, paths, concurrency):
+            found += not isinstance(result, Exception) and result is not None
+        return found
+
+    with tempfile.TemporaryDirectory() as tmp:
+        first = os.path.join(tmp, 'image_000.iso')
+        synthetic_disc.write_image(first, size=args.size, files=args.files, depth=args.depth, udf=args.udf)
+        paths = [first]
+        for index in range(1, args.images):
+            paths.append(os.path.join(tmp, f'image_{index:03}.iso'))
+            os.link(first, paths[-1])
+
+        baseline = None
+        with disc_io.simulated_latency(args.latency_ms / 1000):
+            for concurrency in args.concurrency:
+                start = time.perf_counter()
+                found = asyncio.run(probe(paths, concurrency))
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                print(f"concurrency={concurrency:>4}: {args.images / elapsed:8.1f} images/s  "
+                      f"(x{baseline / elapsed:.1f}, {found} found)")
+
+
+class _RangeRequestHandler(BaseHTTPRequestHandler):
+    """Локальная замена сервера образов: GET с Range и keep-alive, счетчик запросов"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # заголовки и тело уходят разными send
+    root = None
+    requests = 0
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        type(self).requests += 1
+        path = os.path.join(self.root, os.path.basename(self.path))
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            self.send_error(404)
+            return
+
+        m = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if not m:
+            self.send_error(400, 'Range required')
+            return
+        start = int(m.group(1))
+        end = min(int(m.group(2)) if m.group(2) else size - 1, size - 1)
+        if start >= size:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start + 1)
+        self.send_response(206)
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _NoRangeRequestHandler(_RangeRequestHandler):
+    """Сервер без поддержки Range: на любой GET - 200 и весь образ"""
+
+    def do_GET(self):
+        type(self).requests += 1
+        path = os.path.join(self.root, os.path.basename(self.path))
+        self.send_response(200)
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.end_headers()
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    self.wfile.write(chunk)
+        except OSError:
+            pass  # клиент закрыл соединение, не дочитав образ
+
+
+def check_http_without_range(tmp, size=64 * MB):
+    """Образ на сервере без Range: чтение 16 байт должно сразу завершиться
+    ошибкой, не скачивая образ (пик памяти - по tracemalloc)"""
+    synthetic_disc.write_image(os.path.join(tmp, 'norange.iso'), size=size)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _NoRangeRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        image = disc_io.HttpImage(f'http://127.0.0.1:{server.server_port}/norange.iso', pool=disc_io.ConnectionPool())
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            image.pread(16, 0)
+            error = None
+        except OSError as e:
+            error = e
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(f" no-range: {error}; {elapsed * 1000:.2f} ms, пик памяти {peak / 1024:.0f} КБ")
+    if error is None or peak > MB:
+        raise SystemExit("Сервер без Range: ожидалась ошибка без загрузки образа")
+
+
+def bench_http(args):
+    """Идентификация удаленных образов через HTTP Range: сетевые обходы и время"""
+    cases = (
+        ('iso9660', _read_iso9660_system_cnf, {}),
+        ('udf', _read_udf_system_cnf, {'udf': True}),
+        ('identify', ps2.get_playstation2_game_info, {'udf': True}),
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        _RangeRequestHandler.root = tmp
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _RangeRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            for name, func, options in cases:
+                synthetic_disc.write_image(
+                    os.path.join(tmp, f'{name}.iso'), size=args.size, files=args.files, depth=args.depth, **options)
+                url = f'http://127.0.0.1:{server.server_port}/{name}.iso'
+
+                disc_io.http_pool.clear()
+                _RangeRequestHandler.requests = _RangeRequestHandler.connections = 0
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    result = func(url)
+                elapsed = (time.perf_counter() - start) / args.repeat
+                print(f"{name:>9}: {_RangeRequestHandler.requests / args.repeat:6.1f} запросов на образ, "
+                      f"{_RangeRequestHandler.connections} соединений, {elapsed * 1000:7.2f} ms"
+                      f"{'' if result else ', не найден'}")
+        finally:
+            server.shutdown()
+            server.server_close()
+            disc_io.http_pool.clear()
+
+        check_http_without_range(tmp)
+
+
+def _legacy_descriptor_tag(buffer, start=0):
+    """Прежняя проверка тега UDF: побайтовый to_uint8, сумма по модулю 256
+    циклом и побайтовая проверка зарезервированного поля"""
+    checksum = 0
+    for i in range(16):
+        if i != 4:
+            checksum += read_udf.to_uint8(buffer, start + i)
+    while checksum >= 256:
+        checksum -= 256
+    if checksum != read_udf.to_uint8(buffer, start + 4):
+        raise Exception("Checksum mismatch")
+    if read_udf.to_uint8(buffer, start + 5) != 0:
+        raise Exception("Reserve space was not zero")
+    return read_udf.to_uint16(buffer, start)
+
+
+def _walk_udf(udf, path=b'/'):
+    """Обход всех каталогов тома UDF; возвращает число записей"""
+    count = 0
+    for name in udf.listdir(path):
+        child = path.rstrip(b'/') + b'/' + name
+        count += 1
+        if udf.stat(child).is_directory:
+            count += _walk_udf(udf, child)
+    return count
+
+
+def bench_udf_tags(args):
+    """Разбор дескрипторов UDF (теги и File Entry всех файлов) при разных
+    уровнях проверки, а также монтирование тома с обходом всех каталогов"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'udf.iso')
+        synthetic_disc.write_image(path, files=args.files, depth=args.depth, udf=True, file_size=0)
+
+        # Все сектора с дескрипторами: тома, наборы файлов, File Entry
+        descriptors = []
+        with open(path, 'rb') as f:
+            while True:
+                sector = f.read(read_udf.SECTOR_SIZE)
+                if len(sector) < read_udf.SECTOR_SIZE:
+                    break
+                try:
+                    read_udf.DescriptorTag(sector)
+                except Exception:
+                    continue
+                descriptors.append(sector)
+
+        def mount(level):
+            with read_udf.open_udf(path, validation=level) as udf:
+                return _walk_udf(udf)
+
+        def parse(level):
+            return [read_udf.DescriptorTag(buffer, 0, level) for buffer in descriptors]
+
+        elapsed, _ = _best_time(lambda _: [_legacy_descriptor_tag(b) for b in descriptors], None, args.repeat)
+        print(f"{'before':>14}: {len(descriptors) / elapsed:12.0f} tags/s")
+
+        for level in read_udf.VALIDATION_LEVELS:
+            elapsed, _ = _best_time(parse, level, args.repeat)
+            mount_elapsed, entries = _best_time(mount, level, args.repeat)
+            print(f"{level:>14}: {len(descriptors) / elapsed:12.0f} tags/s"
+                  f"  обход {entries} записей за {mount_elapsed * 1000:.2f} ms")
+
+        # Идентификация не меняет уровень проверки для остальных монтирований
+        before = read_udf.validation_level
+        ps2.get_playstation2_game_info(path)
+        print(f"уровень модуля после идентификации: {read_udf.validation_level}")
+        if read_udf.validation_level != before:
+            raise SystemExit("Идентификация изменила уровень проверки UDF модуля")
+
+
+class _CountingFile(object):
+    """Обертка образа, считающая обращения к файлу (seek, read, pread)"""
+
+    def __init__(self, f, counts):
+        self._f = f
+        self._counts = counts
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def _count(self, name):
+        self._counts[name] = self._counts.get(name, 0) + 1
+
+    def seek(self, *args):
+        self._count('seek')
+        return self._f.seek(*args)
+
+    def read(self, *args):
+        self._count('read')
+        return self._f.read(*args)
+
+    def readinto(self, b):
+        self._count('read')
+        return self._f.readinto(b)
+
+    def pread(self, length, offset):
+        self._count('pread')
+        return disc_io.pread(self._f, length, offset)
+
+
+def count_udf_mount_calls(path):
+    """Число обращений к файлу при монтировании UDF и чтении SYSTEM.CNF"""
+    counts = {}
+    open_image = disc_io.open_image
+    disc_io.open_image = lambda image_path: _CountingFile(open_image(image_path), counts)
+    try:
+        with read_udf.open_udf(path) as udf:
+            mounted = dict(counts)
+            udf.get_file(b'/SYSTEM.CNF')
+    finally:
+        disc_io.open_image = open_image
+    return mounted, counts
+
+
+def bench_udf_mount(args):
+    """Обращения к файлу и время монтирования тома UDF"""
+    with tempfile.TemporaryDirectory() as tmp:
+        for raw in (False, True):
+            path = os.path.join(tmp, 'udf.bin' if raw else 'udf.iso')
+            synthetic_disc.write_image(path, size=args.size, files=args.files, depth=args.depth, udf=True, raw=raw)
+            mounted, total = count_udf_mount_calls(path)
+            elapsed, _ = _best_time(lambda p: read_udf.open_udf(p).close(), path, args.repeat)
+            print(f"{'raw' if raw else 'iso':>4}: монтирование {sum(mounted.values())} обращений {mounted}, "
+                  f"с SYSTEM.CNF {sum(total.values())}; {elapsed * 1000:.2f} ms")
+
+
+def bench_udf_walk(args):
+    """Монтирование и обход тома UDF: чтение через pread против mmap,
+    время и объем выделенной памяти (tracemalloc)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'udf.iso')
+        synthetic_disc.write_image(path, files=args.files, depth=args.depth, udf=True, file_size=0)
+
+        def walk(use_mmap):
+            with read_udf.open_udf(path, use_mmap=use_mmap) as udf:
+                return _walk_udf(udf)
+
+        for name, use_mmap in (('pread', False), ('mmap', True)):
+            elapsed, entries = _best_time(walk, use_mmap, args.repeat)
+            tracemalloc.start()
+            walk(use_mmap)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name:>6}: {entries / elapsed:10.0f} записей/s  ({elapsed * 1000:.2f} ms, "
+                  f"пик памяти {peak / 1024:.0f} КБ)")
+
+
+def _legacy_to_dchars(buffer, offset, count):
+    """Прежнее декодирование CS0: список кодов символов и bytes на каждый символ"""
+    if count == 0:
+        return b""
+    alg = read_udf.to_uint8(buffer, offset)
+    result = []
+    pos = 1
+    while pos < count:
+        ch = 0
+        if alg == 16:
+            ch = read_udf.to_uint8(buffer, offset + pos) << 8
+            pos += 1
+        if pos < count:
+            ch |= read_udf.to_uint8(buffer, offset + pos)
+            pos += 1
+        result.append(ch)
+    return b''.join(bytes(chr(n), 'utf-8') for n in result)
+
+
+def bench_udf_names(args):
+    """Декодирование имен файлов UDF (OSTA CS0, 8 и 16 бит) и чтение
+    каталога с десятками тысяч записей"""
+    names = [f'DATA_{i:06d}.BIN' for i in range(args.entries)]
+    for compression, encoding in ((8, 'latin-1'), (16, 'utf-16-be')):
+        buffers = [bytes([compression]) + name.encode(encoding) for name in names]
+        for label, decode in (('before', _legacy_to_dchars), ('after', read_udf.to_dchars)):
+            elapsed, _ = _best_time(lambda _: [decode(b, 0, len(b)) for b in buffers], None, args.repeat)
+            print(f"{label:>7} CS0/{compression:<2}: {len(buffers) / elapsed:12.0f} имен/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'names.iso')
+        synthetic_disc.write_image(path, files=args.entries, depth=0, udf=True, file_size=0)
+        with read_udf.open_udf(path) as udf:
+            start = time.perf_counter()
+            directory = read_udf.Directory(udf.context, udf.root.partition, udf.root.file_entry)
+            elapsed = time.perf_counter() - start
+        print(f"каталог: {len(directory.all_entries)} записей за {elapsed * 1000:.1f} ms "
+              f"({len(directory.all_entries) / elapsed:.0f} записей/s)")
+
+
+def _disc_fs_tasks(path):
+    """Идентификация, метаданные (stat всех файлов) и хеширование через open_disc"""
+    def identify():
+        return ps2.get_playstation2_game_info(path)
+
+    def metadata():
+        with disc_fs.open_disc(path) as disc:
+            return [disc.stat(posixpath.join(top, name)).size
+                    for top, _, names in disc.walk('/') for name in names]
+
+    def checksums():
+        with disc_fs.open_disc(path) as disc:
+            return [hashlib.md5(disc.read_file(posixpath.join(top, name))).hexdigest()
+                    for top, _, names in disc.walk('/') for name in names]
+
+    return identify, metadata, checksums
+
+
+def bench_disc_fs(args):
+    """Обращения к файлу образа, когда три задачи открывают его по очереди
+    и когда делят одно монтирование open_disc"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'disc.iso')
+        synthetic_disc.write_image(path, files=args.files, depth=args.depth, udf=True, file_size=args.file_size)
+        for label, shared in (('separate', False), ('shared', True)):
+            counts = {}
+            opened = []
+            open_image = disc_io.open_image
+
+            def counting_open(image_path):
+                opened.append(image_path)
+                return _CountingFile(open_image(image_path), counts)
+
+            disc_io.open_image = counting_open
+            try:
+                start = time.perf_counter()
+                if shared:
+                    with disc_fs.open_disc(path):
+                        for task in _disc_fs_tasks(path):
+                            task()
+                else:
+                    for task in _disc_fs_tasks(path):
+                        task()
+                elapsed = time.perf_counter() - start
+            finally:
+                disc_io.open_image = open_image
+            print(f"{label:>9}: {sum(counts.values())} обращений к файлу {counts}, открытий {len(opened)}; "
+                  f"{elapsed * 1000:.2f} ms")
+            # Идентификация, метаданные и хеширование делят одно открытие образа
+            if shared and len(opened) != 1:
+                raise SystemExit(f"Общее монтирование открыло образ {len(opened)} раз")
+
+        check_concurrent_identification(tmp, args.threads)
+
+
+def check_concurrent_identification(tmp, threads):
+    """Потоки идентифицируют и хешируют один образ через общий open_disc;
+    результат каждого должен совпасть с последовательным прогоном"""
+    path = os.path.join(tmp, 'shared.iso')
+    synthetic_disc.write_image(path, size=64 * 1024 * 1024, system_cnf=None, boot_file=False, serial_at='end',
+                               udf=True, files=50, depth=2)
+    tasks = (('binary', lambda: ps2._find_in_binary(path, full_scan=True)),
+             ('checksums', _disc_fs_tasks(path)[2]))
+    for name, task in tasks:
+        expected = task()
+        barrier = threading.Barrier(threads)
+        results = [None] * threads
+
+        def run(i):
+            with disc_fs.open_disc(path):  # все потоки держат один и тот же образ
+                barrier.wait()
+                results[i] = task()
+
+        workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        mismatches = sum(result != expected for result in results)
+        print(f"{name:>9}: {threads} потоков на одном образе, расхождений {mismatches}")
+        if mismatches:
+            raise SystemExit(f"{name}: результаты потоков отличаются от последовательного прогона")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    scan = commands.add_parser('scan', help='поиск серийника в сыром образе')
+    scan.add_argument('--size', type=int, default=256, help='размер образа в МБ')
+    scan.add_argument('--repeat', type=int, default=3)
+    scan.set_defaults(func=bench_scan)
+
+    identify = commands.add_parser('identify', help='идентификация папки с образами')
+    identify.add_argument('--images', type=int, default=16)
+    identify.add_argument('--size', type=int, default=64, help='размер образа в МБ')
+    identify.add_argument('--jobs', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    identify.set_defaults(func=bench_identify)
+
+    startup = commands.add_parser('startup', help='загрузка баз серийных номеров')
+    startup.add_argument('--repeat', type=int, default=5)
+    startup.set_defaults(func=bench_startup)
+
+    parsers = commands.add_parser('parsers', help='пути идентификации на синтетических образах')
+    parsers.add_argument('--size', type=synthetic_disc.parse_size, default='1G', help='размер образа: 700M, 4G, ...')
+    parsers.add_argument('--files', type=int, default=200)
+    parsers.add_argument('--depth', type=int, default=4)
+    parsers.add_argument('--repeat', type=int, default=3)
+    parsers.add_argument('--cases', nargs='+', choices=[name for name, _, _ in PARSER_CASES])
+    parsers.add_argument('--json', action='store_true', help='по строке JSON на замер')
+    parsers.set_defaults(func=bench_parsers)
+
+    records = commands.add_parser('records', help='разбор записей каталога ISO9660')
+    records.add_argument('--entries', type=int, default=5000, help='число файлов в каталоге')
+    records.add_argument('--repeat', type=int, default=5)
+    records.set_defaults(func=bench_records)
+
+    latency = commands.add_parser('latency', help='параллельный опрос образов при задержке чтения')
+    latency.add_argument('--images', type=int, default=64)
+    latency.add_argument('--latency-ms', type=float, default=5.0, help='задержка каждого чтения')
+    latency.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 128])
+    latency.add_argument('--udf', action='store_true', help='опрос через UDF вместо ISO9660')
+    latency.add_argument('--size', type=synthetic_disc.parse_size, default='700M')
+    latency.add_argument('--files', type=int, default=50)
+    latency.add_argument('--depth', type=int, default=2)
+    latency.set_defaults(func=bench_latency)
+
+    http = commands.add_parser('http', help='удаленные образы через HTTP Range')
+    http.add_argument('--size', type=synthetic_disc.parse_size, default='4G')
+    http.add_argument('--files', type=int, default=200)
+    http.add_argument('--depth', type=int, default=4)
+    http.add_argument('--repeat', type=int, default=5)
+    http.set_defaults(func=bench_http)
+
+    udf_tags = commands.add_parser('udf-tags', help='проверка дескрипторов UDF по уровням')
+    udf_tags.add_argument('--files', type=int, default=500)
+    udf_tags.add_argument('--depth', type=int, default=3)
+    udf_tags.add_argument('--repeat', type=int, default=5)
+    udf_tags.set_defaults(func=bench_udf_tags)
+
+    udf_mount = commands.add_parser('udf-mount', help='обращения к файлу при монтировании UDF')
+    udf_mount.add_argument('--size', type=synthetic_disc.parse_size, default='700M')
+    udf_mount.add_argument('--files', type=int, default=50)
+    udf_mount.add_argument('--depth', type=int, default=2)
+    udf_mount.add_argument('--repeat', type=int, default=5)
+    udf_mount.set_defaults(func=bench_udf_mount)
+
+    udf_walk = commands.add_parser('udf-walk', help='обход тома UDF: pread против mmap')
+    udf_walk.add_argument('--files', type=int, default=2000)
+    udf_walk.add_argument('--depth', type=int, default=3)
+    udf_walk.add_argument('--repeat', type=int, default=5)
+    udf_walk.set_defaults(func=bench_udf_walk)
+
+    udf_names = commands.add_parser('udf-names', help='декодирование имен UDF (CS0)')
+    udf_names.add_argument('--entries', type=int, default=50000)
+    udf_names.add_argument('--repeat', type=int, default=5)
+    udf_names.set_defaults(func=bench_udf_names)
+
+    disc = commands.add_parser('disc-fs', help='общее монтирование образа (open_disc)')
+    disc.add_argument('--files', type=int, default=200)
+    disc.add_argument('--depth', type=int, default=3)
+    disc.add_argument('--file-size', type=int, default=4096)
+    disc.add_argument('--threads', type=int, default=8)
+    disc.set_defaults(func=bench_disc_fs)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,8 @@ import PyInstaller.__main__
 import sys
 import os
 from pathlib import Path
+from config import INDEX_FILE_NAME
+from serial_index import write_index
 
 def build_exe():
     # Определяем разделитель в зависимости от ОС
@@ -28,6 +30,9 @@ def build_exe():
             print(f"- {f}")
         return
     
+    # Компилируем базы в один индекс: JSON в сборку больше не попадают
+    write_index(db_files, INDEX_FILE_NAME)
+    
     # Базовые параметры
     params = [
         'gui.py',  # Основной файл
@@ -39,9 +44,8 @@ def build_exe():
         '--hidden-import=customtkinter',
     ]
     
-    # Добавляем все файлы баз данных
-    for db_file in db_files:
-        params.append(f'--add-data={db_file}{separator}.')
+    # Добавляем индекс баз данных
+    params.append(f'--add-data={INDEX_FILE_NAME}{separator}.')
     
     # Добавляем специфичные для Linux зависимости
     if not sys.platform.startswith('win'):
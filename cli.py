@@ -0,0 +1,90 @@
+"""Идентификация библиотеки PS2 без графического интерфейса.
+
+Результаты выводятся в stdout по мере готовности (JSON Lines или CSV),
+сообщения о ходе работы - в stderr. Подходит для запуска из cron:
+
+    python cli.py /mnt/nas/PS2 --jobs 8 --since 1d > games.jsonl
+    python cli.py /mnt/nas/PS2 --format csv --no-cache
+
+Сознательно не импортирует customtkinter, PIL и requests.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import re
+import sys
+import time
+from datetime import datetime
+
+from game_identifier import identify_games
+
+FIELDS = ['path', 'serial_number', 'title', 'region', 'method', 'bytes_read', 'error']
+
+
+def parse_since(value):
+    """1d / 12h / 30m - относительно текущего момента, иначе дата ISO 8601"""
+    m = re.fullmatch(r'(\d+)([dhm])', value)
+    if m:
+        seconds = int(m.group(1)) * {'d': 86400, 'h': 3600, 'm': 60}[m.group(2)]
+        return time.time() - seconds
+
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"неверное время: {value}")
+
+
+def _row(path, info):
+    row = {field: info.get(field) for field in FIELDS}
+    row['path'] = path
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('folder', help='папка библиотеки (с подпапками CD/DVD)')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='число рабочих процессов (по умолчанию - число ядер)')
+    parser.add_argument('--cache', metavar='PATH', default=True,
+                        help='файл кэша (по умолчанию ~/.cache/ps2gamesmanager/)')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='не использовать кэш')
+    parser.add_argument('--since', type=parse_since, default=None,
+                        help='только образы, измененные после: 1d, 12h, 30m или 2024-01-31[T12:00]')
+    parser.add_argument('--full-scan', action='store_true',
+                        help='если серийник не найден в начале образа, читать образ целиком')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    parser.add_argument('--quiet', '-q', action='store_true', help='не выводить ход работы в stderr')
+    args = parser.parse_args(argv)
+
+    out = sys.stdout
+    if args.format == 'csv':
+        writer = csv.DictWriter(out, fieldnames=FIELDS)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        write = lambda row: out.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def on_result(path, info):
+        write(_row(path, info))
+        out.flush()
+
+    def on_log(message, tag):
+        if not args.quiet:
+            print(message, file=sys.stderr)
+
+    identify_games(
+        args.folder, on_log, cache=args.cache, jobs=args.jobs,
+        result_callback=on_result, since=args.since, full_scan=args.full_scan
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    try:
+        sys.exit(main())
+    except BrokenPipeError:
+        # Вывод оборвали (например, | head): молча выходим, как обычные утилиты
+        sys.stderr.close()
+        sys.exit(1)
@@ -8,4 +8,13 @@ DATABASE_FILES = [
     "db_playstation2_official_jp.json",
     "db_playstation2_official_ko.json",
     "db_playstation2_official_us.json"
-]
\ No newline at end of file
+]
+# Порядок регионов: если серийник есть в нескольких базах, основным
+# считается название из региона, стоящего раньше
+REGION_PRECEDENCE = ["AS", "AU", "EU", "JP", "KO", "US"]
+# Скомпилированный индекс по всем базам (см. serial_index.py)
+INDEX_FILE_NAME = "db_playstation2.idx"
+
+# Постоянный кэш идентификации (в $XDG_CACHE_HOME, по умолчанию ~/.cache)
+CACHE_DIR_NAME = "ps2gamesmanager"
+CACHE_FILE_NAME = "identification.sqlite3"
@@ -0,0 +1,255 @@
+"""Единый интерфейс к файловой системе образа диска: ISO9660 или UDF.
+
+open_disc(path) один раз определяет, какие файловые системы есть в образе
+(по Volume Recognition Sequence с сектора 16), и возвращает DiscFileSystem
+с listdir, stat, open, read_file и walk. Оба парсера читают образ через один
+файловый объект с общим LRU-кэшем блоков (disc_io.CachedImage, для URL -
+кэш HttpImage), а каждый формат монтируется не больше одного раза.
+
+Открытые образы переиспользуются: пока DiscFileSystem не закрыт всеми, кто
+его открыл, повторный open_disc того же файла возвращает тот же объект.
+Так идентификация, хеширование и извлечение метаданных обходятся одним
+монтированием образа - в том числе из разных потоков: файл образа читается
+только через pread, а обращения к разобранным томам идут под блокировкой.
+
+Пути - как у os: str или bytes (UTF-8), имена возвращаются того же типа,
+что и переданный путь; регистр букв в путях не важен.
+
+Пример:
+    with open_disc('game.iso') as disc:
+        for dirpath, dirnames, filenames in disc.walk('/'):
+            ...
+        system_cnf = disc.read_file('/SYSTEM.CNF')
+"""
+import os
+import posixpath
+import threading
+from collections import namedtuple
+
+import disc_io
+import iso9660
+import read_udf
+
+SECTOR_SIZE = 2048
+# Форматы в порядке предпочтения: мостовой диск по умолчанию читается как ISO9660
+FORMATS = ('iso9660', 'udf')
+# Сколько секторов после системной области просматривается в поисках дескрипторов
+RECOGNITION_SECTORS = 32
+
+DiscStat = namedtuple('DiscStat', ['name', 'size', 'is_dir'])
+
+
+class DiscFormatError(IOError):
+    """В образе нет поддерживаемой файловой системы (или нужного формата)"""
+
+
+# Открытые образы: ключ образа -> DiscFileSystem, пока его кто-то держит
+_open_discs = {}
+_open_discs_lock = threading.Lock()
+
+
+def detect_formats(f):
+    """Форматы файловых систем образа в порядке FORMATS, по одному чтению"""
+    data = disc_io.pread(f, RECOGNITION_SECTORS * SECTOR_SIZE, 16 * SECTOR_SIZE)
+    found = set()
+    for pos in range(0, len(data) - SECTOR_SIZE + 1, SECTOR_SIZE):
+        identifier = data[pos + 1:pos + 6]
+        if identifier == b'CD001':
+            found.add('iso9660')
+        elif identifier in (b'NSR02', b'NSR03'):
+            found.add('udf')
+        elif identifier not in (b'BEA01', b'TEA01', b'BOOT2', b'CDW02'):
+            break
+    return [name for name in FORMATS if name in found]
+
+
+def _image_key(path):
+    """Ключ кэша открытых образов: измененный на диске файл открывается заново"""
+    if disc_io.is_url(path):
+        return path
+    st = os.stat(path)
+    return os.path.realpath(path), st.st_size, st.st_mtime_ns
+
+
+def open_disc(path):
+    """Открывает образ (или возвращает уже открытый) - см. DiscFileSystem.
+
+    Образ без поддерживаемой файловой системы тоже открывается: у него пустой
+    formats, и доступен только file (например, для поиска в сырых данных).
+    """
+    key = _image_key(path)
+    with _open_discs_lock:
+        disc = _open_discs.get(key)
+        if disc is not None:
+            disc._users += 1
+            return disc
+
+    # Образ открывается (с чтениями) вне общей блокировки, чтобы разные образы
+    # открывались параллельно; из двух одновременно открытых остается первый
+    disc = DiscFileSystem(path, key)
+    with _open_discs_lock:
+        existing = _open_discs.get(key)
+        if existing is None:
+            _open_discs[key] = disc
+            return disc
+        existing._users += 1
+    disc.close()
+    return existing
+
+
+class _Iso9660Volume(object):
+    def __init__(self, disc):
+        self._cd = iso9660.ISO9660(disc.path, cache_size=0, file=disc.file)
+
+    def scandir(self, path):
+        # Кто читает каталоги, обычно обходит весь том: индекс путей строится
+        # за одно чтение каждого каталога, и дальнейшие stat/open - без поиска.
+        # Одиночный поиск (SYSTEM.CNF при идентификации) обходится без индекса
+        self._cd.build_index()
+        return [(r.name.decode('latin-1'), bool(r.flags & 2)) for r in self._cd.list_dir(path.encode('utf-8'))]
+
+    def stat(self, path):
+        r = self._cd.get_record(path.encode('utf-8'))
+        return DiscStat(r.name.decode('latin-1') if path.strip('/') else '', r.ex_len, bool(r.flags & 2))
+
+    def open(self, path):
+        return self._cd.open(path.encode('utf-8'))
+
+    def read_file(self, path):
+        return self._cd.get_file(path.encode('utf-8'))
+
+    def close(self):
+        self._cd.close()
+
+
+class _UdfVolume(object):
+    def __init__(self, disc, validation=None):
+        self._udf = read_udf.open_udf(disc.path, file=disc.file, validation=validation)
+
+    def scandir(self, path):
+        directory = self._udf.lookup(path)
+        if not isinstance(directory, read_udf.Directory):
+            raise IOError("Not a directory: {0}".format(path))
+        return [(e.file_identifier, bool(e.file_characteristics & read_udf.FileCharacteristic.directory))
+                for e in directory.all_entries]
+
+    def stat(self, path):
+        st = self._udf.stat(path)
+        return DiscStat(st.name, st.size, st.is_directory)
+
+    def open(self, path):
+        return self._udf.open(path)
+
+    def read_file(self, path):
+        return self._udf.get_file(path)
+
+    def close(self):
+        self._udf.close()
+
+
+_VOLUMES = {'iso9660': _Iso9660Volume, 'udf': _UdfVolume}
+
+
+class DiscFileSystem(object):
+    """Файловая система образа за одним интерфейсом.
+
+    formats - найденные в образе форматы, format - используемый по умолчанию
+    (первый из formats). Методам можно передать format явно, например чтобы
+    прочитать файл мостового диска через UDF, и udf_validation - уровень
+    проверки дескрипторов UDF (read_udf.VALIDATION_*) для этого обращения,
+    None - уровень модуля read_udf; том UDF монтируется по разу на каждый
+    уровень. file - общий файловый объект образа с кэшем блоков;
+    закрывается вместе с последним пользователем.
+    Его читают только через disc_io.pread: позицию seek делят все потоки.
+    """
+
+    def __init__(self, path, key=None):
+        self.path = path
+        self._key = key
+        self._users = 1
+        self._volumes = {}
+        # Парсеры томов хранят состояние разбора в самом объекте
+        self._lock = threading.RLock()
+        f = disc_io.open_image(path)
+        self.file = f if isinstance(f, disc_io.BlockCachedFile) else disc_io.CachedImage(f)
+        try:
+            self.formats = detect_formats(self.file)
+        except BaseException:
+            self.file.close()
+            raise
+        self.format = self.formats[0] if self.formats else None
+
+    def close(self):
+        with _open_discs_lock:
+            self._users -= 1
+            if self._users > 0:
+                return
+            if _open_discs.get(self._key) is self:
+                del _open_discs[self._key]
+
+        with self._lock:
+            for volume in self._volumes.values():
+                volume.close()
+            self._volumes.clear()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def volume(self, format=None, udf_validation=None):
+        """Смонтированный том формата (по умолчанию основного); монтируется один раз"""
+        format = format or self.format
+        if format not in self.formats:
+            raise DiscFormatError("No {0} file system in {1}".format(format or 'supported', self.path))
+        # Том UDF - свой для каждого уровня проверки, ISO9660 от него не зависит
+        key = (format, udf_validation) if format == 'udf' else format
+        with self._lock:
+            volume = self._volumes.get(key)
+            if volume is None:
+                volume = _UdfVolume(self, udf_validation) if format == 'udf' else _VOLUMES[format](self)
+                self._volumes[key] = volume
+            return volume
+
+    @staticmethod
+    def _text(path):
+        return path.decode('utf-8') if isinstance(path, bytes) else path
+
+    @staticmethod
+    def _same_type(name, path):
+        return name.encode('utf-8') if isinstance(path, bytes) else name
+
+    def _scandir(self, path, format, udf_validation):
+        with self._lock:
+            return self.volume(format, udf_validation).scandir(self._text(path))
+
+    def listdir(self, path='/', format=None, udf_validation=None):
+        return [self._same_type(name, path) for name, _ in self._scandir(path, format, udf_validation)]
+
+    def stat(self, path, format=None, udf_validation=None):
+        with self._lock:
+            st = self.volume(format, udf_validation).stat(self._text(path))
+        return st._replace(name=self._same_type(st.name, path))
+
+    def open(self, path, format=None, udf_validation=None):
+        """Файловый объект только для чтения (с seek) поверх содержимого файла;
+        у каждого вызова своя позиция"""
+        with self._lock:
+            return self.volume(format, udf_validation).open(self._text(path))
+
+    def read_file(self, path, format=None, udf_validation=None):
+        """Содержимое файла целиком"""
+        with self._lock:
+            return self.volume(format, udf_validation).read_file(self._text(path))
+
+    def walk(self, top='/', format=None, udf_validation=None):
+        """Как os.walk (сверху вниз): (путь каталога, имена каталогов, имена файлов)"""
+        dirnames, filenames = [], []
+        for name, is_dir in self._scandir(top, format, udf_validation):
+            (dirnames if is_dir else filenames).append(self._same_type(name, top))
+        yield top, dirnames, filenames
+        for name in dirnames:
+            for entry in self.walk(posixpath.join(top, name), format, udf_validation):
+                yield entry
@@ -0,0 +1,593 @@
+"""Общий слой ввода-вывода для образов дисков.
+
+Образы CD с PS2 часто сняты как MODE2/2352 BIN: в каждом «сыром» секторе
+2352 байта, из которых пользовательские данные - 2048 байт со смещением 24
+(после синхропоследовательности, заголовка и подзаголовка XA). Парсеры
+ISO9660 и UDF рассчитаны на «готовые» 2048-байтовые сектора, поэтому
+open_image возвращает для сырого образа файловый объект, который
+отображает логические сектора на пользовательские данные сырых.
+
+Формат определяется по .cue рядом с образом, а без него - по
+синхропоследовательности в начале файла.
+
+Для опроса многих образов на медленном хранилище (NFS/SMB/USB) есть
+asyncio-обертка map_images: она прогоняет синхронные парсеры в
+ограниченном пуле потоков, так что чтения дескрипторов множества образов
+идут одновременно. Заглушка
+simulated_latency добавляет задержку к каждому чтению для замеров.
+
+Образ можно открыть и по URL (http/https): чтения превращаются в запросы
+Range через постоянные соединения из общего пула, соседние блоки
+объединяются в один диапазон, а перед сетью стоит LRU-кэш блоков. Тот же
+кэш (CachedImage) disc_fs ставит перед локальным образом, который делят
+парсеры ISO9660 и UDF.
+
+asyncio и http.client импортируются только там, где нужны (map_images,
+HTTP): модуль импортируют все парсеры и каждый рабочий процесс.
+"""
+import io
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+SECTOR_SIZE = 2048
+SYNC_PATTERN = b'\x00' + b'\xff' * 10 + b'\x00'
+
+# Режим дорожки из .cue -> (размер сырого сектора, смещение данных); None - готовые сектора
+CUE_MODES = {
+    'MODE1/2048': None,
+    'MODE1/2352': (2352, 16),
+    'MODE2/2352': (2352, 24),
+    'MODE2/2336': (2336, 8),
+}
+# Смещение данных по байту режима из заголовка сектора (для 2352-байтовых)
+SYNC_MODES = {1: 16, 2: 24}
+
+# Искусственная задержка каждого чтения в секундах (см. simulated_latency)
+_read_latency = 0.0
+
+# Удаленные образы: размер блока кэша и запроса, число блоков в кэше образа
+HTTP_BLOCK_SIZE = 32 * 1024
+HTTP_CACHE_BLOCKS = 256
+HTTP_TIMEOUT = 30
+HTTP_MAX_IDLE_CONNECTIONS = 8
+
+# Кэш блоков образа, открытого через disc_fs: размер блока, число блоков и
+# самое длинное чтение, которое еще идет через кэш
+IMAGE_CACHE_BLOCK_SIZE = 32 * 1024
+IMAGE_CACHE_BLOCKS = 256
+IMAGE_CACHE_MAX_READ = 1024 * 1024
+
+# Без os.pread (Windows) чтение по смещению - это seek + read, и потоки,
+# делящие файл, держат на это время его блокировку позиции
+_position_locks = weakref.WeakKeyDictionary()
+_position_locks_lock = threading.Lock()
+
+CUE_FILE_PATTERN = re.compile(r'^\s*FILE\s+(?:"([^"]+)"|(\S+))', re.IGNORECASE)
+CUE_TRACK_PATTERN = re.compile(r'^\s*TRACK\s+\d+\s+(\S+)', re.IGNORECASE)
+
+
+def _position_lock(f):
+    with _position_locks_lock:
+        lock = _position_locks.get(f)
+        if lock is None:
+            lock = _position_locks[f] = threading.Lock()
+        return lock
+
+
+def pread(f, length, offset):
+    """Чтение length байт со смещения offset без учета текущей позиции;
+    один файл можно так читать из нескольких потоков"""
+    if hasattr(f, 'pread'):
+        return f.pread(length, offset)
+    if hasattr(os, 'pread'):
+        return os.pread(f.fileno(), length, offset)
+    with _position_lock(f):
+        f.seek(offset)
+        return f.read(length)
+
+
+def preadinto(f, buffer, offset):
+    """Как pread, но в готовый буфер (bytearray или memoryview) без
+    промежуточного bytes; возвращает число прочитанных байт"""
+    if hasattr(f, 'preadinto'):
+        return f.preadinto(buffer, offset)
+    if hasattr(f, 'pread'):
+        data = f.pread(len(buffer), offset)
+        memoryview(buffer).cast('B')[:len(data)] = data
+        return len(data)
+    if hasattr(os, 'preadv'):
+        return os.preadv(f.fileno(), [buffer], offset)
+    with _position_lock(f):
+        f.seek(offset)
+        return f.readinto(buffer)
+
+
+def is_url(path):
+    return isinstance(path, str) and path.lower().startswith(('http://', 'https://'))
+
+
+def get_size(f):
+    """Логический размер образа в байтах"""
+    if hasattr(f, 'size'):
+        return f.size
+    return os.fstat(f.fileno()).st_size
+
+
+def _cue_layout(path):
+    """Формат первой дорожки из .cue с тем же именем, что и образ, если он есть"""
+    base = os.path.splitext(path)[0]
+    for cue_path in (base + '.cue', base + '.CUE'):
+        try:
+            with open(cue_path, 'r', encoding='utf-8', errors='replace') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            continue
+
+        in_file = False
+        for line in lines:
+            m = CUE_FILE_PATTERN.match(line)
+            if m:
+                in_file = os.path.basename(m.group(1) or m.group(2)).lower() == os.path.basename(path).lower()
+                continue
+            m = CUE_TRACK_PATTERN.match(line)
+            if m and in_file:
+                mode = m.group(1).upper()
+                if mode in CUE_MODES:
+                    return True, CUE_MODES[mode]
+                return False, None
+    return False, None
+
+
+def detect_layout(f, path=None):
+    """(размер сырого сектора, смещение данных) или None для готовых 2048-байтовых секторов"""
+    if path:
+        found, layout = _cue_layout(path)
+        if found:
+            return layout
+
+    head = pread(f, 16, 0)
+    if head[:12] == SYNC_PATTERN and head[15] in SYNC_MODES:
+        return 2352, SYNC_MODES[head[15]]
+    return None
+
+
+class RawSectorFile(io.RawIOBase):
+    """Файловый объект с логическими 2048-байтовыми секторами поверх сырого образа"""
+
+    def __init__(self, f, raw_sector_size, data_offset):
+        super().__init__()
+        self._f = f
+        self.raw_sector_size = raw_sector_size
+        self.data_offset = data_offset
+        self.size = get_size(f) // raw_sector_size * SECTOR_SIZE
+        self.name = getattr(f, 'name', None)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError("invalid whence ({0})".format(whence))
+        if pos < 0:
+            raise ValueError("negative seek position {0}".format(pos))
+        self._pos = pos
+        return pos
+
+    def pread(self, length, offset):
+        end = min(offset + length, self.size)
+        if offset >= end:
+            return b''
+
+        # Все затронутые сырые сектора читаются одним запросом
+        first = offset // SECTOR_SIZE
+        count = (end - 1) // SECTOR_SIZE - first + 1
+        raw = memoryview(pread(self._f, count * self.raw_sector_size, first * self.raw_sector_size))
+        data = b''.join(
+            raw[start:start + SECTOR_SIZE]
+            for start in range(self.data_offset, len(raw), self.raw_sector_size)
+        )
+        skip = offset - first * SECTOR_SIZE
+        return data[skip:skip + end - offset]
+
+    def readinto(self, b):
+        data = self.pread(len(b), self._pos)
+        n = len(data)
+        memoryview(b).cast('B')[:n] = data
+        self._pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+        super().close()
+
+
+class LatencyFile(io.RawIOBase):
+    """Заглушка медленного хранилища: каждое чтение ждет latency секунд"""
+
+    def __init__(self, f, latency):
+        super().__init__()
+        self._f = f
+        self.latency = latency
+        self.name = getattr(f, 'name', None)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def fileno(self):
+        return self._f.fileno()
+
+    @property
+    def size(self):
+        return get_size(self._f)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._f.seek(offset, whence)
+
+    def tell(self):
+        return self._f.tell()
+
+    def readinto(self, b):
+        time.sleep(self.latency)
+        return self._f.readinto(b)
+
+    def pread(self, length, offset):
+        time.sleep(self.latency)
+        return pread(self._f, length, offset)
+
+    def preadinto(self, buffer, offset):
+        time.sleep(self.latency)
+        return preadinto(self._f, buffer, offset)
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+        super().close()
+
+
+@contextmanager
+def simulated_latency(seconds):
+    """Образы, открытые внутри блока, отвечают на каждое чтение с задержкой"""
+    global _read_latency
+    previous, _read_latency = _read_latency, seconds
+    try:
+        yield
+    finally:
+        _read_latency = previous
+
+
+class ConnectionPool(object):
+    """Простаивающие keep-alive соединения по (схема, хост:порт), общие для всех образов"""
+
+    def __init__(self, max_idle=HTTP_MAX_IDLE_CONNECTIONS):
+        self.max_idle = max_idle
+        self.created = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, scheme, netloc):
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+            self.created += 1
+        import http.client
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(netloc, timeout=HTTP_TIMEOUT), False
+
+    def put(self, scheme, netloc, connection):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+http_pool = ConnectionPool()
+
+
+class BlockCachedFile(io.RawIOBase):
+    """Основа образов с LRU-кэшем блоков: pread собирает ответ из кэша, а
+    недостающие соседние блоки получает одним вызовом _fetch(start, end).
+
+    Чтения длиннее max_cached_read (например, содержимое больших файлов или
+    окна поиска серийника) идут мимо кэша, чтобы не вытеснять метаданные.
+
+    pread потокобезопасен (кэш под блокировкой, сам _fetch - без нее), так
+    что один объект могут делить потоки; seek/read/readinto работают с общей
+    позицией и годятся только для единственного пользователя.
+    """
+
+    def __init__(self, block_size, cache_blocks, max_cached_read=None):
+        super().__init__()
+        self._block_size = block_size
+        self._cache_blocks = cache_blocks
+        self._max_cached_read = max_cached_read
+        self._cache = OrderedDict()  # номер блока -> bytes, давно использованные первыми
+        self._lock = threading.Lock()
+        self._size = None
+        self._pos = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.bytes_fetched = 0  # прочитано из источника, мимо кэша и в кэш
+
+    def _fetch(self, start, end):
+        """Байты [start, end) из источника (короче - только в конце образа)"""
+        raise NotImplementedError
+
+    def _fetch_into(self, start, buffer):
+        """То же, что _fetch, но в готовый буфер; возвращает число байт"""
+        data = self._fetch(start, start + len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError("invalid whence ({0})".format(whence))
+        if pos < 0:
+            raise ValueError("negative seek position {0}".format(pos))
+        self._pos = pos
+        return pos
+
+    def pread(self, length, offset):
+        end = offset + length
+        if self._size is not None:
+            end = min(end, self._size)
+        if offset >= end:
+            return b''
+        if self._max_cached_read is not None and end - offset > self._max_cached_read:
+            data = self._fetch(offset, end)
+            with self._lock:
+                self.bytes_fetched += len(data)
+            return data
+
+        first = offset // self._block_size
+        last = (end - 1) // self._block_size
+        blocks = {}
+        with self._lock:
+            for index in range(first, last + 1):
+                block = self._cache.get(index)
+                if block is not None:
+                    self.cache_hits += 1
+                    self._cache.move_to_end(index)
+                    blocks[index] = block
+
+        # Недостающие соседние блоки запрашиваются одним диапазоном
+        run_start = None
+        for index in range(first, last + 2):
+            missing = index <= last and index not in blocks
+            if missing and run_start is None:
+                run_start = index
+            elif not missing and run_start is not None:
+                self._fetch_blocks(run_start, index, blocks)
+                run_start = None
+
+        data = b''.join(blocks.get(index, b'') for index in range(first, last + 1))
+        skip = offset - first * self._block_size
+        return data[skip:skip + end - offset]
+
+    def preadinto(self, buffer, offset):
+        """pread в готовый буфер; длинное чтение мимо кэша идет прямо в него"""
+        view = memoryview(buffer).cast('B')
+        length = len(view)
+        if self._size is not None:
+            length = max(0, min(length, self._size - offset))
+        if self._max_cached_read is not None and length > self._max_cached_read:
+            read = self._fetch_into(offset, view[:length])
+            with self._lock:
+                self.bytes_fetched += read
+            return read
+        data = self.pread(length, offset)
+        view[:len(data)] = data
+        return len(data)
+
+    def _fetch_blocks(self, first, stop, blocks):
+        data = self._fetch(first * self._block_size, stop * self._block_size)
+        with self._lock:
+            self.bytes_fetched += len(data)
+            for index in range(first, stop):
+                start = (index - first) * self._block_size
+                block = data[start:start + self._block_size]
+                self.cache_misses += 1
+                blocks[index] = block
+                if block:
+                    self._cache[index] = block
+            while len(self._cache) > self._cache_blocks:
+                self._cache.popitem(last=False)
+
+    def readinto(self, b):
+        n = self.preadinto(b, self._pos)
+        self._pos += n
+        return n
+
+    def close(self):
+        with self._lock:
+            self._cache.clear()
+        super().close()
+
+
+class CachedImage(BlockCachedFile):
+    """Локальный (или сырой BIN) образ за LRU-кэшем блоков; см. disc_fs"""
+
+    def __init__(self, f, block_size=IMAGE_CACHE_BLOCK_SIZE, cache_blocks=IMAGE_CACHE_BLOCKS,
+                 max_cached_read=IMAGE_CACHE_MAX_READ):
+        super().__init__(block_size, cache_blocks, max_cached_read)
+        self._f = f
+        self.name = getattr(f, 'name', None)
+        self._size = get_size(f)
+
+    @property
+    def size(self):
+        return self._size
+
+    def _fetch(self, start, end):
+        return pread(self._f, end - start, start)
+
+    def _fetch_into(self, start, buffer):
+        return preadinto(self._f, buffer, start)
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+        super().close()
+
+
+class HttpImage(BlockCachedFile):
+    """Удаленный образ: чтения через HTTP Range с LRU-кэшем блоков.
+
+    requests - число запросов к серверу (сетевых обходов) для этого образа.
+    """
+
+    def __init__(self, url, pool=None, block_size=HTTP_BLOCK_SIZE, cache_blocks=HTTP_CACHE_BLOCKS):
+        super().__init__(block_size, cache_blocks)
+        parts = urlsplit(url)
+        self.name = url
+        self._scheme = parts.scheme.lower()
+        self._netloc = parts.netloc
+        self._path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        self._pool = pool or http_pool
+        self.requests = 0
+
+    @property
+    def size(self):
+        if self._size is None:
+            self.pread(1, 0)
+        return self._size
+
+    def _fetch(self, start, end):
+        """Один запрос Range на байты [start, end); повтор на новом соединении,
+        если сервер закрыл простаивавшее"""
+        import http.client
+        headers = {'Range': 'bytes={0}-{1}'.format(start, end - 1)}
+        while True:
+            connection, reused = self._pool.get(self._scheme, self._netloc)
+            try:
+                connection.request('GET', self._path, headers=headers)
+                response = connection.getresponse()
+                # Тело читается только у ответа на Range: сервер без поддержки
+                # Range отвечает 200 со всем образом
+                data = response.read() if response.status in (206, 416) else None
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if reused:
+                    continue
+                raise
+            break
+
+        self.requests += 1
+        if data is None or response.will_close:
+            # Непрочитанное тело остается в соединении - переиспользовать нельзя
+            response.close()
+            connection.close()
+        else:
+            self._pool.put(self._scheme, self._netloc, connection)
+
+        # Content-Range: bytes 0-32767/734003200 (или bytes */734003200 для 416)
+        content_range = response.getheader('Content-Range', '')
+        if '/' in content_range and content_range.rsplit('/', 1)[1].isdigit():
+            self._size = int(content_range.rsplit('/', 1)[1])
+
+        if response.status == 206:
+            return data
+        if response.status == 416:
+            return b''
+        raise OSError("HTTP {0} {1} for range request to {2}".format(response.status, response.reason, self.name))
+
+
+def open_image(path):
+    """Открывает образ на чтение; сырой BIN - через RawSectorFile, URL - через HttpImage"""
+    if is_url(path):
+        f = HttpImage(path)
+        path = None  # .cue для удаленных образов не ищется
+    else:
+        f = open(path, 'rb')
+    if _read_latency:
+        f = LatencyFile(f, _read_latency)
+    try:
+        layout = detect_layout(f, path)
+    except BaseException:
+        f.close()
+        raise
+    if layout is None:
+        return f
+    return RawSectorFile(f, *layout)
+
+
+def _call(func, path):
+    try:
+        return path, func(path)
+    except Exception as e:
+        return path, e
+
+
+async def map_images(func, paths, concurrency=32):
+    """Асинхронный генератор (путь, результат или исключение) в порядке готовности.
+
+    func - синхронная функция от пути (например, поиск SYSTEM.CNF);
+    одновременно выполняется не больше concurrency вызовов, каждый в своем
+    потоке, поэтому ожидание чтения одного образа не задерживает другие.
+    """
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    loop = asyncio.get_running_loop()
+    paths = iter(paths)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = set()
+        while True:
+            for path in paths:
+                pending.add(loop.run_in_executor(executor, _call, func, path))
+                if len(pending) >= concurrency:
+                    break
+
+            if not pending:
+                return
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
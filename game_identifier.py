@@ -1,36 +1,233 @@
-import tkinter as tk
+import os
+import queue
+import sqlite3
+import threading
+import multiprocessing
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
 from pathlib import Path
-from identify_playstation2_games import get_playstation2_game_info
+from identify_playstation2_games import database_fingerprint, get_playstation2_game_info
+from identification_cache import IdentificationCache
+from config import ART_FOLDER_NAME
 
-def identify_games(folder_path, log_callback, progress_callback=None):
-    total_files = 0
+IMAGE_EXTENSIONS = ('.iso', '.bin', '.img')
+IMAGE_DIRS = ('CD', 'DVD')
+# Способы поиска серийника в порядке отчета; binary - поиск в сырых данных
+METHODS = ('iso9660', 'udf', 'binary')
+
+def _open_cache(cache):
+    """cache: True - кэш по умолчанию, путь - свой файл, False/None - без кэша"""
+    if not cache:
+        return None
+    return IdentificationCache(None if cache is True else cache, database=database_fingerprint())
+
+def _identify_uncached(path, full_scan=False):
+    """Идентифицирует один образ; выполняется в рабочем процессе"""
+    try:
+        info = get_playstation2_game_info(path, full_scan)
+    except OSError:
+        # Ошибки чтения (например, отвалившийся NAS) не кэшируем
+        raise
+    except Exception as e:
+        return {'error': str(e)}
+    return dict(info, serial_number=info['serial_number'].decode('utf-8'))
+
+def discover_images(folder_path):
+    """Лениво обходит библиотеку через os.scandir и выдает DirEntry образов.
+
+    Файлы рассматриваются только внутри папок CD/DVD, папка с обложками
+    не обходится вовсе, а тип и расширение берутся из записи каталога
+    без лишних вызовов stat.
+    """
+    folder_path = Path(folder_path)
+    stack = [(str(folder_path), any(part in IMAGE_DIRS for part in folder_path.parts))]
+    while stack:
+        path, in_image_dir = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name != ART_FOLDER_NAME:
+                            subdirs.append((entry.path, in_image_dir or entry.name in IMAGE_DIRS))
+                    elif (in_image_dir and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS
+                            and entry.is_file()):
+                        yield entry
+        except OSError:
+            continue
+
+        # Обход в алфавитном порядке
+        stack.extend(sorted(subdirs, reverse=True))
+
+def _run_parallel(items, jobs, full_scan=False):
+    """Генератор (путь, stat, результат или исключение) в порядке готовности.
+
+    items читается лениво: образы уходят в работу, пока обход еще идет.
+    Окно ожидающих образов разбито на очереди по дискам (st_dev), и в пул
+    они отдаются по кругу, чтобы параллельные чтения шли на разные устройства.
+    """
+    if jobs == 1:
+        for file_path, stat_result in items:
+            try:
+                yield file_path, stat_result, _identify_uncached(str(file_path), full_scan)
+            except Exception as e:
+                yield file_path, stat_result, e
+        return
+
+    items = iter(items)
+    window = jobs * 2
+    queues = {}
+    queued = 0
+    exhausted = False
+    in_flight = {}
+
+    # spawn: воркеры не наследуют потоки и окно GUI, и так же работает сборка под Windows;
+    # процессы запускаются по мере надобности, так что полностью закэшированный обход их не создает
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+        while True:
+            while not exhausted and queued < window:
+                item = next(items, None)
+                if item is None:
+                    exhausted = True
+                else:
+                    queues.setdefault(item[1].st_dev, deque()).append(item)
+                    queued += 1
+
+            while queued and len(in_flight) < window:
+                for queue in queues.values():
+                    if queue and len(in_flight) < window:
+                        file_path, stat_result = queue.popleft()
+                        queued -= 1
+                        future = executor.submit(_identify_uncached, str(file_path), full_scan)
+                        in_flight[future] = (file_path, stat_result)
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path, stat_result = in_flight.pop(future)
+                try:
+                    yield file_path, stat_result, future.result()
+                except Exception as e:
+                    yield file_path, stat_result, e
+
+def identify_games(folder_path, log_callback, progress_callback=None, cache=True, jobs=None,
+                   result_callback=None, since=None, full_scan=False):
+    """Ищет и идентифицирует образы в папке.
+
+    result_callback(путь, info) вызывается для каждого образа по мере готовности,
+    info - словарь с serial_number/title/region/method либо с error.
+    since - отметка времени: образы, измененные раньше, пропускаются.
+    full_scan - искать серийник во всем образе, а не только в начальных окнах.
+    """
     game_info_list = []
     folder_path = Path(folder_path)
+    jobs = jobs or os.cpu_count() or 1
 
     log_callback("🔍 Начинается идентификация игр...", "info")
 
-    # Подсчет общего количества файлов
-    file_list = list(folder_path.rglob("*"))
-    total_files = len(file_list)
+    total_files = 0
+    processed = 0
+    methods = Counter()
+
+    try:
+        identification_cache = _open_cache(cache)
+    except (OSError, sqlite3.Error) as e:
+        log_callback(f"⚠ Кэш недоступен, идентификация без него: {str(e)}", "warning")
+        identification_cache = None
+
+    def report(file_path, info):
+        nonlocal processed
+        processed += 1
+        if isinstance(info, Exception):
+            info = {'error': str(info)}
+        if result_callback:
+            result_callback(str(file_path), info)
+
+        if info.get('error'):
+            log_callback(f"⚠ Ошибка {file_path.name}: {info['error']}", "error")
+        else:
+            serial = info['serial_number'].strip()
+            title = info['title'].strip()
+            game_info_list.append((str(file_path), serial, title))
+            methods[info.get('method')] += 1
+            log_callback(f"✅ Найдено: {file_path.name} | {serial} - {title}", "success")
+
+        if progress_callback:
+            progress_callback(processed, total_files)
+
+    # Обход идет в отдельном потоке с опережением: total_files - число уже
+    # найденных образов, а не только тех, до которых дошла идентификация
+    candidates = queue.Queue()
+    discovery_errors = []
 
-    for idx, file_path in enumerate(file_list):
-        if file_path.is_file() and file_path.suffix.lower() in ('.iso', '.bin', '.img'):
-            if 'CD' in file_path.parts or 'DVD' in file_path.parts:
+    def discover():
+        nonlocal total_files
+        try:
+            for entry in discover_images(folder_path):
                 try:
-                    info = get_playstation2_game_info(str(file_path))
-                    serial = info['serial_number'].decode('utf-8').strip()
-                    title = info['title'].strip()
-                    
-                    game_info_list.append((str(file_path), serial, title))
-                    
-                    log_callback(f"✅ Найдено: {file_path.name} | {serial} - {title}", "success")
-                    if progress_callback:
-                        progress_callback(idx + 1, total_files)
+                    stat_result = entry.stat()
+                except OSError as e:
+                    stat_result = e
+                else:
+                    if since is not None and stat_result.st_mtime < since:
+                        continue
+                total_files += 1
+                candidates.put((entry.path, stat_result))
+        except Exception as e:
+            discovery_errors.append(e)
+        finally:
+            candidates.put(None)
 
-                except Exception as e:
-                    log_callback(f"⚠ Ошибка {file_path.name}: {str(e)}", "error")
-                    if progress_callback:
-                        progress_callback(idx + 1, total_files)
+    with identification_cache or nullcontext():
+        def uncached():
+            """Образы из обхода, которых нет в кэше; найденные в кэше сразу в отчет"""
+            while True:
+                item = candidates.get()
+                if item is None:
+                    break
+                path, stat_result = item
+                file_path = Path(path)
+                if isinstance(stat_result, OSError):
+                    report(file_path, stat_result)
+                    continue
+
+                info = identification_cache.get(path, stat_result) if identification_cache else None
+                if info is not None and full_scan and info.get('error'):
+                    # Ошибка могла быть получена без полного поиска - повторяем
+                    info = None
+                if info is None:
+                    yield file_path, stat_result
+                else:
+                    report(file_path, info)
+
+            if discovery_errors:
+                raise discovery_errors[0]
+
+        threading.Thread(target=discover, daemon=True).start()
+        for file_path, stat_result, info in _run_parallel(uncached(), jobs, full_scan):
+            if identification_cache and not isinstance(info, Exception):
+                identification_cache.put(str(file_path), stat_result, info)
+            report(file_path, info)
+
+        if identification_cache:
+            log_callback(
+                f"💾 Кэш: {identification_cache.hits} из "
+                f"{identification_cache.hits + identification_cache.misses} "
+                f"({identification_cache.hit_ratio:.0%})", "info"
+            )
+
+    if methods:
+        log_callback(
+            "📊 Способ: " + ", ".join(f"{method} {methods[method]}" for method in METHODS)
+            + f" (без файловой системы: {methods['binary']} из {sum(methods.values())})", "info"
+        )
+
+    # Порядок завершения в пуле случаен, итоговый список - по пути
+    game_info_list.sort()
 
     log_callback(f"\n🎮 Всего найдено игр: {len(game_info_list)}", "info")
-    return game_info_list
\ No newline at end of file
+    return game_info_list
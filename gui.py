@@ -1,6 +1,7 @@
 import customtkinter as ctk
 from customtkinter import filedialog, CTkImage
 import threading
+import multiprocessing
 from PIL import Image, UnidentifiedImageError
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
@@ -746,5 +747,7 @@ class PS2GameManager(ctk.CTk):
             self.log_message(f"Ошибка при добавлении игр: {str(e)}", "error")
 
 if __name__ == "__main__":
+    # Нужно для пула процессов идентификации в собранном PyInstaller-бинарнике
+    multiprocessing.freeze_support()
     app = PS2GameManager()
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+from pathlib import Path
+
+from config import CACHE_DIR_NAME, CACHE_FILE_NAME
+
+# Версия схемы (PRAGMA user_version); кэш другой версии пересоздается
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS identification (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode    INTEGER NOT NULL,
+    device   INTEGER NOT NULL,
+    database TEXT NOT NULL,
+    serial   TEXT,
+    title    TEXT,
+    region   TEXT,
+    method   TEXT,
+    error    TEXT
+)
+"""
+# Через сколько новых записей они фиксируются на диске: прерванное
+# сканирование большой библиотеки теряет не больше этого числа результатов
+COMMIT_INTERVAL = 100
+
+def default_cache_path():
+    """Путь к кэшу по умолчанию: $XDG_CACHE_HOME/ps2gamesmanager/"""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return Path(cache_home) / CACHE_DIR_NAME / CACHE_FILE_NAME
+
+def file_identity(stat_result):
+    """Кортеж, по которому определяется, что файл не менялся"""
+    return (stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino, stat_result.st_dev)
+
+class IdentificationCache:
+    """Результаты идентификации образов в SQLite, ключ - путь и stat файла.
+
+    Запись считается устаревшей и удаляется, как только меняется размер,
+    время изменения, inode или устройство файла, а также отпечаток баз
+    серийных номеров (database): после обновления баз образы с ошибкой
+    "игра не найдена" и прежними названиями идентифицируются заново.
+    """
+
+    def __init__(self, path=None, database=''):
+        self.path = Path(path) if path else default_cache_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.database = database
+        self._db = sqlite3.connect(str(self.path), timeout=30)
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._db.execute("DROP TABLE IF EXISTS identification")
+            self._db.execute("PRAGMA user_version = {0}".format(SCHEMA_VERSION))
+        self._db.execute(SCHEMA)
+        self._pending = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, path, stat_result):
+        """Возвращает сохраненный результат или None, если файл менялся"""
+        row = self._db.execute(
+            "SELECT size, mtime_ns, inode, device, database, serial, title, region, method, error "
+            "FROM identification WHERE path = ?", (path,)
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        if tuple(row[:4]) != file_identity(stat_result) or row[4] != self.database:
+            self._db.execute("DELETE FROM identification WHERE path = ?", (path,))
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        serial, title, region, method, error = row[5:]
+        if error is not None:
+            return {'error': error}
+        return {'serial_number': serial, 'title': title, 'region': region, 'method': method}
+
+    def put(self, path, stat_result, info):
+        """Сохраняет результат идентификации (или текст ошибки в info['error'])"""
+        self._db.execute(
+            "INSERT OR REPLACE INTO identification VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path,) + file_identity(stat_result) + (
+                self.database, info.get('serial_number'), info.get('title'), info.get('region'),
+                info.get('method'), info.get('error'),
+            )
+        )
+        self._pending += 1
+        if self._pending >= COMMIT_INTERVAL:
+            self._db.commit()
+            self._pending = 0
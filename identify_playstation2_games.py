@@ -1,14 +1,24 @@
 import sys
 import os
 import re
-import json
+import itertools
 import read_udf
-import iso9660
+import disc_io
+import disc_fs
+import serial_index
+from config import DATABASE_FILES, INDEX_FILE_NAME
 
 IS_PY2 = sys.version_info[0] == 2
 
 BUFFER_SIZE = 1024 * 1024 * 10
 MAX_PREFIX_LEN = 6
+# Максимальная длина серийника; на столько же перекрываются соседние блоки
+MAX_SERIAL_LEN = 32
+
+# Для идентификации достаточно контрольной суммы тегов UDF: CRC и
+# зарезервированные поля проверяются только в строгом режиме. Уровень задается
+# чтению через disc_fs, уровень модуля read_udf остается прежним
+UDF_VALIDATION = read_udf.VALIDATION_CHECKSUM_ONLY
 
 # Все возможные префиксы серийных номеров
 PREFIXES = [
@@ -31,89 +41,278 @@ def get_resource_path(relative_path):
     
     return os.path.join(base_path, relative_path)
 
-# Используйте эту функцию для пути к JSON файлу
-DB_PATH = get_resource_path('db_playstation2_official_au.json')
-
-try:
-    with open(DB_PATH, 'r', encoding='utf-8') as f:
-        DB = json.load(f)
-except Exception as e:
-    print(f"Ошибка при загрузке базы данных: {str(e)}")
-    print(f"Искомый путь: {DB_PATH}")
-    sys.exit(1)
-
-# Загрузка баз данных
-db_files = [
-    'db_playstation2_official_as.json',
-    'db_playstation2_official_au.json',
-    'db_playstation2_official_eu.json',
-    'db_playstation2_official_jp.json',
-    'db_playstation2_official_ko.json',
-    'db_playstation2_official_us.json'
-]
+# Индекс серийных номеров загружается при первом поиске, а не при импорте
+INDEX_PATH = get_resource_path(INDEX_FILE_NAME)
+_serial_index = None
+
+def database_fingerprint():
+    """Отпечаток баз серийных номеров: результаты, полученные с другими
+    базами (в том числе "игра не найдена"), считаются устаревшими"""
+    # Сначала индекс пересобирается, если базы новее, - иначе отпечаток
+    # сменится посреди сканирования
+    _get_serial_index()
+    return serial_index.database_fingerprint(
+        [INDEX_PATH] + [get_resource_path(db_file) for db_file in DATABASE_FILES]
+    )
+
+def _get_serial_index():
+    global _serial_index
+    if _serial_index is None:
+        _serial_index = serial_index.load_index(
+            INDEX_PATH, [get_resource_path(db_file) for db_file in DATABASE_FILES]
+        )
+    return _serial_index
+
+# Один проход по буферу вместо 53: быстрый поиск ';' (memchr), а затем
+# проверка короткого окна перед ним - цифры, разделитель и префикс из таблицы
+SERIAL_TAIL_PATTERN = re.compile(br'[-_][\d\.]+;\Z')
+PREFIX_PRIORITY = {prefix: index for index, prefix in enumerate(PREFIXES)}
+PREFIX_LENGTHS = sorted({len(prefix) for prefix in PREFIXES})
+SERIAL_DIGITS = frozenset(b'0123456789.')
+
+def _normalize_serial(raw_serial):
+    """Приводит найденную строку к виду SLUS-20312"""
+    return raw_serial.replace(b'.', b'').replace(b'_', b'-').replace(b';', b'')
+
+def _search_serial(data, end):
+    """Ищет серийный номер в data[:end] за один проход.
+
+    Сохраняет прежний приоритет: побеждает префикс, стоящий раньше в PREFIXES,
+    а учитывается только первое вхождение каждого префикса.
+    """
+    best_priority = len(PREFIXES)
+    best_match = None
+    seen = set()
+    pos = data.find(b';', 0, end)
+    while pos != -1:
+        m = None
+        if pos > 0 and data[pos - 1] in SERIAL_DIGITS:
+            m = SERIAL_TAIL_PATTERN.search(data, max(0, pos - MAX_SERIAL_LEN), pos + 1)
+
+        if m:
+            start = m.start()
+            head = bytes(data[max(0, start - MAX_PREFIX_LEN):start])
+            for length in PREFIX_LENGTHS:
+                prefix = head[-length:]
+                priority = PREFIX_PRIORITY.get(prefix)
+                if priority is None or prefix in seen:
+                    continue
+                seen.add(prefix)
+
+                body = m.group()
+                if b'999.99' in body or priority >= best_priority:
+                    continue
+
+                best_priority = priority
+                best_match = prefix + body
+                if priority == 0:
+                    return best_match
+
+        pos = data.find(b';', pos + 1, end)
+
+    return best_match
+
+SECTOR_SIZE = 2048
+
+# Окна пробного поиска в сыром образе, в порядке чтения: системная область
+# (сектора 0-15), дескрипторы тома (16-31), корневой каталог ISO9660 и
+# первые PROBE_HEAD_SIZE байт. Весь файл читается только по запросу (full_scan)
+PROBE_WINDOWS = ('system_area', 'volume_descriptors', 'root_directory', 'head')
+PROBE_HEAD_SIZE = 1024 * 1024 * 64
+MAX_ROOT_DIRECTORY_SIZE = 1024 * 1024
+
+class _BinaryProbe(object):
+    """Поиск серийника по диапазонам файла без повторного чтения и с подсчетом байт.
+
+    Читает только через pread/preadinto: образ может делить несколько потоков.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.size = disc_io.get_size(f)
+        self.bytes_read = 0
+        self._covered = []  # уже прочитанные диапазоны [start, end)
+        # Один буфер на весь файл: хвост предыдущего блока + новый блок;
+        # растет до BUFFER_SIZE, только если окно больше
+        self._buffer = bytearray()
+
+    def read_at(self, offset, length):
+        data = disc_io.pread(self.f, length, offset)
+        self.bytes_read += len(data)
+        return data
+
+    @property
+    def complete(self):
+        """Просмотрен ли уже весь образ"""
+        return next(self._uncovered(0, self.size), None) is None
+
+    def _uncovered(self, start, end):
+        for covered_start, covered_end in sorted(self._covered):
+            if covered_start > start:
+                yield start, min(end, covered_start)
+            start = max(start, covered_end)
+            if start >= end:
+                return
+        if start < end:
+            yield start, end
 
-dbs = {}
-for db_file in db_files:
-    db_path = get_resource_path(db_file)
-    with open(db_path, 'rb') as f:
-        dbs[db_file] = json.loads(f.read().decode('utf8'))
-
-# Преобразование ключей в байты
-for db in dbs.values():
-    keys = list(db.keys())
-    for key in keys:
-        if isinstance(key, str):
-            val = db[key]
-            db.pop(key)
-            db[bytes(key, 'utf-8')] = val
-        else:
-            print(f"Неверный тип ключа: {key} (тип: {type(key)})")
-
-def _find_in_binary(file_name):
-    f = open(file_name, 'rb')
-    file_size = os.path.getsize(file_name)
-    while True:
-        # Чтение в буфер
-        rom_data = f.read(BUFFER_SIZE)
-
-        # Проверка конца файла
-        if not rom_data:
-            return None
-
-        # Поиск серийного номера
-        for prefix in PREFIXES:
-            m = re.search(prefix + br"[-_][\d\.]+;", rom_data)
-            if m and m.group() and b'999.99' not in m.group():
-                serial_number = m.group().replace(b'.', b'').replace(b'_', b'-').replace(b';', b'')
-                return serial_number
-
-        # Перемещение в файле
-        pos = f.tell()
-        if pos > MAX_PREFIX_LEN and pos < file_size:
-            f.seek(pos - MAX_PREFIX_LEN)
-
-    return None
-
-def get_playstation2_game_info(file_name):
+    def scan(self, start, end):
+        """Ищет серийник в [start, end), пропуская уже прочитанное"""
+        end = min(end, self.size)
+        for part_start, part_end in list(self._uncovered(start, end)):
+            # Захват хвоста соседнего прочитанного диапазона, чтобы не потерять
+            # серийник на стыке
+            serial = self._scan_range(max(0, part_start - MAX_SERIAL_LEN), part_end)
+            self._covered.append((part_start, part_end))
+            if serial:
+                return serial
+        return None
+
+    def _scan_range(self, start, end):
+        size = MAX_SERIAL_LEN + min(BUFFER_SIZE, end - start)
+        if len(self._buffer) < size:
+            self._buffer = bytearray(size)
+        buffer = self._buffer
+        view = memoryview(buffer)
+        carried = 0
+        while start < end:
+            # Чтение в буфер
+            read = disc_io.preadinto(self.f, view[carried:carried + min(BUFFER_SIZE, end - start)], start)
+
+            # Проверка конца файла
+            if not read:
+                return None
+            self.bytes_read += read
+            start += read
+
+            # Поиск серийного номера
+            stop = carried + read
+            serial = _search_serial(buffer, stop)
+            if serial:
+                return serial
+
+            # Перенос хвоста в начало буфера
+            carried = min(MAX_SERIAL_LEN, stop)
+            buffer[:carried] = buffer[stop - carried:stop]
+        return None
+
+    def window(self, name, head_size):
+        """Диапазон окна (start, end) или None, если окна в образе нет"""
+        if name == 'system_area':
+            return 0, 16 * SECTOR_SIZE
+        if name == 'volume_descriptors':
+            return 16 * SECTOR_SIZE, 32 * SECTOR_SIZE
+        if name == 'root_directory':
+            # Запись корневого каталога в Primary Volume Descriptor (смещение 156)
+            pvd = self.read_at(16 * SECTOR_SIZE, SECTOR_SIZE)
+            if len(pvd) < 190 or pvd[0:6] != b'\x01CD001':
+                return None
+            location = int.from_bytes(pvd[158:162], 'little') * SECTOR_SIZE
+            length = min(int.from_bytes(pvd[166:170], 'little'), MAX_ROOT_DIRECTORY_SIZE)
+            return location, location + length
+        if name == 'head':
+            return 0, head_size
+        raise ValueError("Неизвестное окно поиска: {0}".format(name))
+
+def _find_in_binary(file_name, full_scan=False, windows=PROBE_WINDOWS, head_size=PROBE_HEAD_SIZE):
+    """Ищет серийник в сырых данных образа.
+
+    Сначала читаются только окна windows; остаток файла - лишь при full_scan.
+    Возвращает пару (серийный номер или None, прочитано байт).
+    """
+    with disc_fs.open_disc(file_name) as disc:
+        serial, probe = _probe_binary(disc.file, full_scan, windows, head_size)
+        return serial, probe.bytes_read
+
+def _probe_binary(f, full_scan=False, windows=PROBE_WINDOWS, head_size=PROBE_HEAD_SIZE):
+    """То же, что _find_in_binary, по уже открытому образу.
+
+    Возвращает пару (серийный номер или None, _BinaryProbe): по нему видно,
+    сколько прочитано и весь ли образ просмотрен.
+    """
+    # Сырой BIN читается через слой трансляции, так что окна - в логических секторах
+    probe = _BinaryProbe(f)
+    ranges = (probe.window(name, head_size) for name in windows)
+    if full_scan:
+        ranges = itertools.chain(ranges, [(0, probe.size)])
+
+    for window in ranges:
+        serial = probe.scan(*window) if window else None
+        if serial:
+            return _normalize_serial(serial), probe
+
+    return None, probe
+
+# Строка загрузки из SYSTEM.CNF, например: BOOT2 = cdrom0:\SLUS_203.12;1
+BOOT2_PATTERN = re.compile(br'^\s*BOOT2\s*=\s*cdrom0:\\?([^;\r\n]+)', re.IGNORECASE | re.MULTILINE)
+
+def _parse_system_cnf(data):
+    """Извлекает серийный номер из строки BOOT2 файла SYSTEM.CNF"""
+    m = BOOT2_PATTERN.search(data)
+    if not m:
+        return None
+
+    # Исполняемый файл может лежать в подпапке: cdrom0:\DATA\SLUS_203.12;1
+    boot_file = m.group(1).strip().replace(b'/', b'\\').split(b'\\')[-1] + b';'
+    serial = _search_serial(boot_file, len(boot_file))
+    if not serial:
+        return None
+    return _normalize_serial(serial)
+
+def _read_system_cnf(disc, format):
+    return disc.read_file(b'/SYSTEM.CNF', format=format, udf_validation=UDF_VALIDATION)
+
+def _find_in_filesystem(disc):
+    """Читает серийный номер из SYSTEM.CNF через файловые системы образа.
+
+    Возвращает пару (серийный номер, способ) или (None, None).
+    """
+    for method in disc.formats:
+        try:
+            system_cnf = _read_system_cnf(disc, method)
+        except Exception:
+            continue
+
+        serial_number = _parse_system_cnf(system_cnf) if system_cnf else None
+        if serial_number:
+            return serial_number, method
+
+    return None, None
+
+def get_playstation2_game_info(file_name, full_scan=False):
     # Пропуск, если не ISO или BIN
     if not os.path.splitext(file_name)[1].lower() in ['.iso', '.bin']:
         raise Exception("Not an ISO or BIN file.")
 
-    # Поиск серийного номера в файле
-    serial_number = _find_in_binary(file_name)
+    # Поиск серийного номера: сначала SYSTEM.CNF (несколько КБ чтения),
+    # затем окна сырых данных, а весь файл - только при full_scan. Образ
+    # открывается один раз: файловые системы и поиск делят файл и кэш блоков,
+    # и по его счетчику видно, сколько всего прочитано из образа (если образ
+    # одновременно читают другие потоки - вместе с их чтениями)
+    with disc_fs.open_disc(file_name) as disc:
+        fetched = disc.file.bytes_fetched
+        serial_number, method = _find_in_filesystem(disc)
+        scanned_all = True
+        if not serial_number:
+            (serial_number, probe), method = _probe_binary(disc.file, full_scan), 'binary'
+            scanned_all = probe.complete
+        bytes_read = disc.file.bytes_fetched - fetched
     if not serial_number:
-        raise Exception("Failed to find serial number in file.")
+        # Полный поиск имеет смысл, только если поиск остановился раньше конца образа
+        raise Exception("Failed to find serial number in file (read {0} bytes{1}).".format(
+            bytes_read, '' if scanned_all else ', try a full scan'))
 
     # Поиск названия игры в базах данных
-    for db_name, db in dbs.items():
-        if serial_number in db:
-            region = db_name.split('_')[-1].upper()  # Извлекаем регион из имени файла
-            title = db[serial_number]
-            return {
-                'serial_number': serial_number,
-                'region': region,
-                'title': title,
-                'disc_type': 'Binary'  # Упрощенно, можно добавить логику для CD/DVD
-            }
-
-    raise Exception("Failed to find game in database.")
+    found = _get_serial_index().lookup(serial_number)
+    if not found:
+        raise Exception("Failed to find game in database.")
+
+    return {
+        'serial_number': serial_number,
+        'region': found.region,
+        'title': found.title,
+        'alternate_titles': dict(found.alternates),  # Названия из других регионов
+        'disc_type': 'Binary',  # Упрощенно, можно добавить логику для CD/DVD
+        'method': method,  # Как найден серийник: iso9660, udf или binary
+        'bytes_read': bytes_read  # Прочитано байт образа (файловые системы и поиск)
+    }
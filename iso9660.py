@@ -24,10 +24,13 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 
+import io
 import sys
-import urllib
 import struct
 import datetime
+from collections import OrderedDict
+
+import disc_io
 
 PY2 = (sys.version_info[0] == 2)
 
@@ -41,6 +44,110 @@ else:
 	from io import BytesIO
 
 SECTOR_SIZE = 2048
+SECTOR_CACHE_SIZE = 0x400000      #bytes kept in the LRU sector cache
+SECTOR_CACHE_MAX_READ = 0x100000  #larger reads (file contents) bypass the cache
+
+#directory record header up to the file identifier; both-endian fields are
+#read from their little-endian half
+DIR_RECORD = struct.Struct('<BBI4xI4x7sBBBH2xB')
+
+_structs = {} #format string -> precompiled struct.Struct
+
+def _dir_datetime(date):
+    epoch = datetime.datetime(1970, 1, 1)
+    t = list(bytearray(date[:-1]))
+    t[0] += 1900
+    t_offset = struct.unpack('<b', date[-1:])[0] * 15 * 60.    # Offset from GMT in 15min intervals, converted to secs
+    t_timestamp = (datetime.datetime(*t) - epoch).total_seconds() - t_offset
+    t_datetime = datetime.datetime.fromtimestamp(t_timestamp)
+    return t_datetime.strftime('%Y-%m-%d %H:%M:%S')
+
+class ISO9660File(io.RawIOBase):
+    """Read-only view of one extent of an ISO9660 image, see ISO9660.open()"""
+
+    def __init__(self, cd, start, length, name=None):
+        super(ISO9660File, self).__init__()
+        self._cd     = cd
+        self._start  = start
+        self._length = length
+        self._pos    = 0
+        self.name    = name
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._length + offset
+        else:
+            raise ValueError("invalid whence ({0})".format(whence))
+        if pos < 0:
+            raise ValueError("negative seek position {0}".format(pos))
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        length = min(len(b), self._length - self._pos)
+        if length <= 0:
+            return 0
+        data = self._cd._read_at(self._start + self._pos, length)
+        n = len(data)
+        memoryview(b).cast('B')[:n] = data
+        self._pos += n
+        return n
+
+def _normalize_path(path):
+    """b'/data//slus_203.12;1' -> b'DATA/SLUS_203.12'"""
+    parts = [p for p in path.upper().split(b'/') if p]
+    if parts:
+        parts[-1] = parts[-1].split(b';')[0]
+    return b'/'.join(parts)
+
+class DirectoryRecord(object):
+    """A file or folder entry; the datetime string is decoded on first access"""
+    __slots__ = ('ex_loc', 'ex_len', 'flags', 'interleave_unit_size',
+                 'interleave_gap_size', 'volume_sequence', 'name', '_datetime')
+
+    @classmethod
+    def unpack_from(cls, buff, offset=0):
+        (l0, l1, ex_loc, ex_len, date, flags, unit_size, gap_size,
+         volume_sequence, l2) = DIR_RECORD.unpack_from(buff, offset)
+
+        d = cls.__new__(cls)
+        d.ex_loc               = ex_loc
+        d.ex_len               = ex_len
+        d.flags                = flags
+        d.interleave_unit_size = unit_size
+        d.interleave_gap_size  = gap_size
+        d.volume_sequence      = volume_sequence
+        d._datetime            = date
+
+        start = offset + DIR_RECORD.size
+        name = bytes(buff[start:start + l2]).rstrip(b' ').split(b';')[0]
+        d.name = b'' if name == b'\x00' else name
+        return d
+
+    @property
+    def datetime(self):
+        if not isinstance(self._datetime, str):
+            self._datetime = _dir_datetime(bytes(self._datetime))
+        return self._datetime
+
+    #dict-style access, as records used to be plain dicts
+    def __getitem__(self, key):
+        return getattr(self, key)
 
 class ISO9660IOError(IOError):
     def __init__(self, path):
@@ -49,17 +156,42 @@ class ISO9660IOError(IOError):
     def __str__(self):
         return "Path not found: {0}".format(self.path)
 
-class ISO9660(object):
+class ISO9660FormatError(IOError):
     def __init__(self, url):
+        self.url = url
+
+    def __str__(self):
+        return "Not an ISO9660 volume: {0}".format(self.url)
+
+class ISO9660(object):
+    def __init__(self, url, cache_size=SECTOR_CACHE_SIZE, index=False, file=None):
         self._buff  = None #input buffer
         self._root  = None #root node
         self._pvd   = {}   #primary volume descriptor
         self._paths = []   #path table
+        self._file  = file #file handle kept open for the lifetime of the object
+        self._owns_file = file is None #a handle passed in is shared and left open by close()
+        self._closed = False
+        self._index = None #normalized full path -> record, see build_index()
+        self._use_index = index
+
+        self._cache       = OrderedDict() #(sector, length) -> bytes, least recently used first
+        self._cache_size  = cache_size    #in bytes
+        self._cache_bytes = 0
+        self.cache_hits   = 0
+        self.cache_misses = 0
 
         self._url   = url
         if not hasattr(self, '_get_sector'): #it might have been set by a subclass
-            self._get_sector = self._get_sector_url if url.startswith('http') else self._get_sector_file
+            self._get_sector = self._get_sector_file #local files and http(s) URLs alike, see disc_io
 
+        try:
+            self._read_descriptors()
+        except:
+            self.close()
+            raise
+
+    def _read_descriptors(self):
         ### Volume Descriptors
         sector = 0x10
         while True:
@@ -67,6 +199,11 @@ class ISO9660(object):
             sector += 1
             ty = self._unpack('B')
 
+            #stop early on images without a volume descriptor set (UDF-only, raw BIN)
+            if self._unpack_raw(5) != b'CD001':
+                raise ISO9660FormatError(self._url)
+            self._buff.seek(1)
+
             if ty == 1:
                 self._unpack_pvd()
             elif ty == 255:
@@ -97,6 +234,21 @@ class ISO9660(object):
 
         assert l0 == 0
 
+    def close(self):
+        self._closed = True
+        if self._file:
+            if self._owns_file:
+                self._file.close()
+            self._file = None
+        self._cache.clear()
+        self._cache_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
     ##
     ## Generator listing available files/folders
     ##
@@ -120,10 +272,10 @@ class ISO9660(object):
                     yield d
 
     def _tree_node(self, node):
-        spacer = lambda s: node['name'] + b"/" + s
+        spacer = lambda s: node.name + b"/" + s
         for c in list(self._unpack_dir_children(node)):
-            yield spacer(c['name'])
-            if c['flags'] & 2:
+            yield spacer(c.name)
+            if c.flags & 2:
                 for d in self._tree_node(c):
                     yield spacer(d)
 
@@ -132,7 +284,30 @@ class ISO9660(object):
     ##
 
     def get_file(self, path):
-        path = path.upper().strip(b'/').split(b'/')
+        f = self.get_record(path)
+        self._get_sector(f.ex_loc, f.ex_len)
+        return self._unpack_raw(f.ex_len)
+
+    def open(self, path):
+        """Returns a seekable read-only file object over a file's extent.
+
+        Data is fetched with positioned reads on demand, so large files can
+        be hashed, copied or inspected without buffering them in memory.
+        """
+        f = self.get_record(path)
+        return ISO9660File(self, f.ex_loc * SECTOR_SIZE, f.ex_len, name=path)
+
+    def get_record(self, path):
+        if not _normalize_path(path):
+            return self._root
+
+        if self._use_index or self._index is not None:
+            f = self.build_index().get(_normalize_path(path))
+            if f is None:
+                raise ISO9660IOError(path)
+            return f
+
+        path = _normalize_path(path).split(b'/')
         path, filename = path[:-1], path[-1]
 
         if len(path)==0:
@@ -143,28 +318,88 @@ class ISO9660(object):
             except ISO9660IOError:
                 parent_dir = self._dir_record_by_root(path)
 
-        f = self._search_dir_children(parent_dir, filename)
+        return self._search_dir_children(parent_dir, filename)
+
+    def list_dir(self, path):
+        """Records of a directory's entries, without '.' and '..'"""
+        d = self.get_record(path)
+        if not d.flags & 2:
+            raise ISO9660IOError(path)
+        return list(self._unpack_dir_children(d))
+
+    ##
+    ## Full path index
+    ##
+
+    def build_index(self):
+        """Maps every normalized full path (upper case, no version) to its record.
+
+        Directories come from the path table, and each directory extent is
+        read once, in disc order; afterwards lookups cost no I/O.
+        """
+        if self._index is not None:
+            return self._index
+
+        #full path of every directory in the path table (parents come first),
+        #upper-cased like the keys _normalize_path() produces for lookups
+        dir_paths = []
+        for p in self._paths:
+            if p['parent'] == 1 and not dir_paths:
+                dir_paths.append(b'') #root
+            else:
+                parent = dir_paths[p['parent']-1]
+                name = p['name'].upper()
+                dir_paths.append(parent + b'/' + name if parent else name)
+
+        index = {b'': self._root}
+        for i in sorted(range(len(self._paths)), key=lambda i: self._paths[i]['ex_loc']):
+            prefix = dir_paths[i] + b'/' if dir_paths[i] else b''
+            for c in self._unpack_dir_children(self._paths[i]):
+                index[prefix + c.name.upper()] = c
 
-        self._get_sector(f['ex_loc'], f['ex_len'])
-        return self._unpack_raw(f['ex_len'])
+        self._index = index
+        return index
 
     ##
     ## Methods for retrieving partial contents
     ##
 
-    def _get_sector_url(self, sector, length):
-        start = sector * SECTOR_SIZE
-        if self._buff:
-            self._buff.close()
-        opener = urllib.FancyURLopener()
-        opener.http_error_206 = lambda *a, **k: None
-        opener.addheader(b"Range", b"bytes={0}-{1}".format(start, start+length-1))
-        self._buff = opener.open(self._url)
+    def _read_at(self, offset, length):
+        """Reads length bytes at a byte offset, bypassing the sector cache"""
+        if self._get_sector != self._get_sector_file:
+            sector, skip = divmod(offset, SECTOR_SIZE)
+            self._get_sector(sector, skip + length)
+            self._unpack_raw(skip)
+            return self._unpack_raw(length)
+
+        return disc_io.pread(self._open_file(), length, offset)
+
+    def _open_file(self):
+        """The image handle, opened on first use; never reopened after close()"""
+        if self._closed:
+            raise ValueError("I/O operation on closed ISO9660 image: {0}".format(self._url))
+        if self._file is None:
+            self._file = disc_io.open_image(self._url) #raw 2352-byte BIN is translated to 2048-byte sectors
+        return self._file
 
     def _get_sector_file(self, sector, length):
-        with open(self._url, 'rb') as f:
-            f.seek(sector*SECTOR_SIZE)
-            self._buff = BytesIO(f.read(length))
+        key = (sector, length)
+        data = self._cache.get(key)
+        if data is not None:
+            self.cache_hits += 1
+            self._cache.move_to_end(key)
+            self._buff = BytesIO(data)
+            return
+
+        self.cache_misses += 1
+        data = disc_io.pread(self._open_file(), length, sector*SECTOR_SIZE) #no shared file position
+        self._buff = BytesIO(data)
+
+        if length <= min(SECTOR_CACHE_MAX_READ, self._cache_size):
+            self._cache[key] = data
+            self._cache_bytes += len(data)
+            while self._cache_bytes > self._cache_size:
+                self._cache_bytes -= len(self._cache.popitem(last=False)[1])
 
     ##
     ## Return the record for final directory in a path
@@ -174,7 +409,7 @@ class ISO9660(object):
         for e in self._paths[::-1]:
             search = list(path)
             f = e
-            while f['name'] == search[-1]:
+            while f['name'].upper() == search[-1]: #path components are upper-cased by _normalize_path()
                 search.pop()
                 f = self._paths[f['parent']-1]
                 if f['parent'] == 1:
@@ -239,59 +474,40 @@ class ISO9660(object):
         if l0 == 0:
             return read+1, None
 
-        l1 = self._unpack('B')
-
-        d = dict()
-        d['ex_loc']               = self._unpack_both('I')
-        d['ex_len']               = self._unpack_both('I')
-        d['datetime']             = self._unpack_dir_datetime()
-        d['flags']                = self._unpack('B')
-        d['interleave_unit_size'] = self._unpack('B')
-        d['interleave_gap_size']  = self._unpack('B')
-        d['volume_sequence']      = self._unpack_both('h')
-
-        l2 = self._unpack('B')
-        d['name'] = self._unpack_string(l2).split(b';')[0]
-        if d['name'] == b'\x00':
-            d['name'] = b''
-
-        if l2 % 2 == 0:
-            self._unpack('B')
-
-        t = 34 + l2 - (l2 % 2)
-
-        e = l0-t
-        if e>0:
-            extra = self._unpack_raw(e)
-
-        return read+l0, d
+        buff = bytearray([l0]) + self._unpack_raw(l0 - 1)
+        return read+l0, DirectoryRecord.unpack_from(buff)
 
     #Assuming d is a directory record, this generator yields its children
     def _unpack_dir_children(self, d):
         sector = d['ex_loc']
-        read = 0
-        self._get_sector(sector, 2048)
+        self._get_sector(sector, SECTOR_SIZE)
+        extent = self._unpack_raw(SECTOR_SIZE)
 
-        read, r_self = self._unpack_record(read)
-        read, r_parent = self._unpack_record(read)
+        #the '.' record holds the real extent length (path table entries do not)
+        ex_len = DIR_RECORD.unpack_from(extent)[3]
+        if ex_len > SECTOR_SIZE:
+            self._get_sector(sector, ex_len)
+            extent = self._unpack_raw(ex_len)
 
-        while read < r_self['ex_len']: #Iterate over files in the directory
-            if read % 2048 == 0:
-                sector += 1
-                self._get_sector(sector, 2048)
-            read, data = self._unpack_record(read)
+        view = memoryview(extent)
+        end = min(ex_len, len(extent))
+        read = 0
+        index = 0
+        while read < end: #Iterate over files in the directory
+            l0 = view[read]
+            if l0 == 0: #end of records in this sector
+                read = (read // SECTOR_SIZE + 1) * SECTOR_SIZE
+                continue
 
-            if data == None: #end of directory listing
-                to_read = 2048 - (read % 2048)
-                self._unpack_raw(to_read)
-                read += to_read
-            else:
-                yield data
+            if index >= 2: #skip '.' and '..'
+                yield DirectoryRecord.unpack_from(view, read)
+            index += 1
+            read += l0
 
     #Search for one child amongst the children
     def _search_dir_children(self, d, term):
         for e in self._unpack_dir_children(d):
-            if e['name'] == term:
+            if e.name.upper() == term:
                 return e
 
         raise ISO9660IOError(term)
@@ -313,10 +529,11 @@ class ISO9660(object):
         return self._buff.read(l).rstrip(b' ')
 
     def _unpack(self, st):
-        if st[0] not in ('<','>'):
-            st = '<' + st
-        d = struct.unpack(st, self._buff.read(struct.calcsize(st)))
-        if len(st) == 2:
+        s = _structs.get(st)
+        if s is None:
+            s = _structs[st] = struct.Struct(st if st[0] in ('<','>') else '<' + st)
+        d = s.unpack(self._buff.read(s.size))
+        if len(d) == 1:
             return d[0]
         else:
             return d
@@ -324,22 +541,6 @@ class ISO9660(object):
     def _unpack_vd_datetime(self):
         return self._unpack_raw(17) #TODO
 
-    def _unpack_dir_datetime(self):
-        epoch = datetime.datetime(1970, 1, 1)
-        date = self._unpack_raw(7)
-        t = []
-        date_sub = date[:-1]
-        for i in range(len(date_sub)):
-            n = date_sub[i : i + 1]
-            t.append(struct.unpack('<B', n)[0])
-        t.append(struct.unpack('<b', date[-1 : ])[0])
-        t[0] += 1900
-        t_offset = t.pop(-1) * 15 * 60.    # Offset from GMT in 15min intervals, converted to secs
-        t_timestamp = (datetime.datetime(*t) - epoch).total_seconds() - t_offset
-        t_datetime = datetime.datetime.fromtimestamp(t_timestamp)
-        t_readable = t_datetime.strftime('%Y-%m-%d %H:%M:%S')
-        return t_readable
-
 
 
 if __name__ == '__main__':
@@ -349,9 +550,10 @@ if __name__ == '__main__':
     else:
         iso_path = sys.argv[1]
         ret_path = sys.argv[2] if len(sys.argv) > 2 else None
-        cd = ISO9660(iso_path)
-        if ret_path:
-            sys.stdout.write(cd.get_file(ret_path))
-        else:
-            for path in cd.tree():
-                print(path)
+        with ISO9660(iso_path) as cd:
+            if ret_path:
+                out = getattr(sys.stdout, 'buffer', sys.stdout)
+                out.write(cd.get_file(ret_path.encode('utf-8') if not PY2 else ret_path))
+            else:
+                for path in cd.tree():
+                    print(path)
@@ -34,40 +34,70 @@
 
 
 import sys, os
+import io
+import mmap
 import struct
+from binascii import crc_hqx
+from bisect import bisect_right
+from collections import namedtuple
+
+import disc_io
 
 IS_PY2 = sys.version_info[0] == 2
 
 MAX_INT = 2 ** (struct.Struct('i').size * 8 - 1) - 1
 HEADER_SIZE = 1024 * 32
 SECTOR_SIZE = 1024 * 2 # FIXME: This should not be hard coded
-
-
+# Sectors fetched per read of the Volume Recognition Sequence, and the most
+# sectors of a Volume Descriptor Sequence extent read at once
+VRS_BATCH_SECTORS = 16
+MAX_VDS_SECTORS = 256
+# Most Allocation Extent Descriptors followed for one file (guards against loops)
+MAX_ALLOCATION_EXTENTS = 4096
+
+# How much of each descriptor is verified while parsing:
+# strict - tag checksum, descriptor CRC and zeroed reserved fields
+# checksum-only - just the tag checksum (enough to tell descriptors from garbage)
+# off - only that the tag identifier is known
+VALIDATION_STRICT = 'strict'
+VALIDATION_CHECKSUM_ONLY = 'checksum-only'
+VALIDATION_OFF = 'off'
+VALIDATION_LEVELS = (VALIDATION_STRICT, VALIDATION_CHECKSUM_ONLY, VALIDATION_OFF)
+# Module default; a mount can use its own level (open_udf(..., validation = ...))
+validation_level = VALIDATION_STRICT
+
+DESCRIPTOR_TAG = struct.Struct('<HHBBHHHI')
+# File Identifier Descriptor fields after the tag, skipping the ICB (decoded on use)
+FILE_IDENTIFIER_HEADER = struct.Struct('<HBB16xH')
+UINT8 = struct.Struct('<B')
+UINT16 = struct.Struct('<H')
+UINT32 = struct.Struct('<I')
+UINT64 = struct.Struct('<Q')
+
+
+def _check_validation_level(level):
+	if level not in VALIDATION_LEVELS:
+		raise ValueError("Unknown validation level '{0}', expected one of {1}".format(level, ', '.join(VALIDATION_LEVELS)))
+
+
+def set_validation_level(level):
+	global validation_level
+	_check_validation_level(level)
+	validation_level = level
+
+
+# Little endian integers decoded in place, from bytes, bytearray, memoryview or mmap
 def to_uint8(buffer, start = 0):
-	return struct.unpack('B', buffer[start : start + 1])[0]
+	return UINT8.unpack_from(buffer, start)[0]
 
 def to_uint16(buffer, start = 0):
-	left = ((to_uint8(buffer, start + 1) << 8) & 0xFF00)
-	right = ((to_uint8(buffer, start + 0) << 0) & 0x00FF)
-	return (left | right)
+	return UINT16.unpack_from(buffer, start)[0]
 
 def to_uint32(buffer, start = 0):
-	a = ((to_uint8(buffer, start + 3) << 24) & 0xFF000000)
-	b = ((to_uint8(buffer, start + 2) << 16) & 0x00FF0000)
-	c = ((to_uint8(buffer, start + 1) << 8) & 0x0000FF00)
-	d = ((to_uint8(buffer, start + 0) << 0) & 0x000000FF)
-	return(a | b | c | d)
+	return UINT32.unpack_from(buffer, start)[0]
 
 def to_uint64(buffer, start = 0):
-	a = ((to_uint8(buffer, start + 7) << 56) & 0xFF00000000000000)
-	b = ((to_uint8(buffer, start + 6) << 48) & 0x00FF000000000000)
-	c = ((to_uint8(buffer, start + 5) << 40) & 0x0000FF0000000000)
-	d = ((to_uint8(buffer, start + 4) << 32) & 0x000000FF00000000)
-	e = ((to_uint8(buffer, start + 3) << 24) & 0x00000000FF000000)
-	f = ((to_uint8(buffer, start + 2) << 16) & 0x0000000000FF0000)
-	g = ((to_uint8(buffer, start + 1) << 8) & 0x000000000000FF00)
-	h = ((to_uint8(buffer, start + 0) << 0) & 0x00000000000000FF)
-	return(a | b | c | d | e | f | g | h)
+	return UINT64.unpack_from(buffer, start)[0]
 
 def round_up(value, unit):
 	return ((value + (unit - 1)) // unit) * unit
@@ -76,41 +106,29 @@ def to_dstring(buffer, offset, count):
 	byte_len = to_uint8(buffer, offset + count - 1)
 	return to_dchars(buffer, offset, byte_len)
 
+# OSTA CS0 compression IDs: 8 bits per character, or 16 bits big endian
+CS0_ENCODINGS = {8: 'latin-1', 16: 'utf-16-be'}
+
+# Decodes count bytes of OSTA Compressed Unicode (the compression ID and the characters) to a str
 def to_dchars(buffer, offset, count):
 	if count == 0:
-		return b""
-
-	alg = to_uint8(buffer, offset)
+		return u""
 
-	if alg not in [8, 16]:
+	encoding = CS0_ENCODINGS.get(to_uint8(buffer, offset))
+	if encoding is None:
 		raise Exception("Corrupt compressed unicode string")
 
-	result = []
-
-	pos = 1
-	while pos < count:
-		ch = to_uint8(b"\0")
-
-		if alg == 16:
-			ch = (to_uint8(buffer, offset + pos) << 8)
-			pos += 1
-
-		if pos < count:
-			ch |= to_uint8(buffer, offset + pos)
-			pos += 1
-
-		result.append(ch)
-
-	# Convert from ints to chars
-	if IS_PY2:
-		result = [bytes(chr(n)) for n in result]
-	else:
-		result = [bytes(chr(n), 'utf-8') for n in result]
-
-	return b''.join(result)
+	data = bytes(buffer[offset + 1 : offset + count])
+	# An odd trailing byte of a 16 bit string is the high byte of the last character
+	if len(data) % 2 and encoding == 'utf-16-be':
+		data += b"\0"
+	return data.decode(encoding)
 
 
 class BaseTag(object):
+	# Validation level of the mount this descriptor belongs to, None for the module default
+	validation = None
+
 	def __init__(self, size, buffer, start):
 		self._size = size
 
@@ -120,6 +138,9 @@ class BaseTag(object):
 		return self._size
 	size = property(get_size)
 
+	def _validation_level(self):
+		return self.validation or validation_level
+
 	# Make sure there is enough space
 	def _assert_size(self, buffer, start):
 		# Just return if the size is zero
@@ -131,21 +152,19 @@ class BaseTag(object):
 
 	# Make sure the checksums match
 	def _assert_checksum(self, buffer, start, expected_checksum):
-		checksum = 0
-		for i in range(16):
-			if i == 4:
-				continue
-
-			checksum += to_uint8(buffer, start + i)
-
-		# Truncate int to uint8
-		b = checksum
-		while checksum >= 256:
-			checksum -= 256
+		# The checksum byte itself (offset 4) is not part of the sum
+		checksum = (sum(bytearray(buffer[start : start + 16])) - expected_checksum) & 0xFF
 
 		if not checksum == expected_checksum:
 			raise Exception("Checksum was {0}, but {1} was expected".format(checksum, expected_checksum))
 
+	# Make sure the CRC of the descriptor body matches (CRC-16/CCITT, as crc_hqx computes it)
+	def _assert_crc(self, buffer, start, length, expected_crc):
+		crc = crc_hqx(buffer[start : start + length], 0)
+
+		if not crc == expected_crc:
+			raise Exception("CRC was {0}, but {1} was expected".format(crc, expected_crc))
+
 	# Make sure it is the correct type of tag
 	def _assert_tag_identifier(self, expected_tag_identifier):
 		if not self.descriptor_tag.tag_identifier == expected_tag_identifier:
@@ -153,20 +172,55 @@ class BaseTag(object):
 
 	# Make sure the reserved space is all zeros
 	def _assert_reserve_space(self, buffer, start, length):
-		buf_seg = buffer[start : start + length]
-		for i in range(len(buf_seg)):
-			n = buf_seg[i : i + 1]
-			if not to_uint8(n) == 0:
-				raise Exception("Reserve space at {0} was not zero.".format(start))
+		if self._validation_level() != VALIDATION_STRICT:
+			return
+
+		buf_seg = bytes(buffer[start : start + length])
+		if buf_seg.count(b'\0') != len(buf_seg):
+			raise Exception("Reserve space at {0} was not zero.".format(start))
 
 
 class UdfContext(object):
-	def __init__(self, file, physical_sector_size):
+	def __init__(self, file, physical_sector_size, use_mmap = False, owns_file = True, validation = None):
 		self.file = file
+		self.owns_file = owns_file # a shared handle is left open by close()
+		self.validation = validation # level this mount's descriptors are checked at, None for the module default
 		self.logical_partitions = []
 		self.physical_partitions = {}
 		self.physical_sector_size = physical_sector_size
 
+		# With use_mmap a plain local image is mapped and descriptors are
+		# decoded in place from slices of this memoryview instead of copies
+		self.view = None
+		self._mmap = None
+		if use_mmap and isinstance(file, io.BufferedReader):
+			try:
+				self._mmap = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+			# Empty files, or images bigger than the address space
+			except (OSError, ValueError, OverflowError):
+				self._mmap = None
+			else:
+				self.view = memoryview(self._mmap)
+
+	# Returns length bytes at offset: a memoryview of the mapping, or bytes read from the file
+	def read(self, offset, length):
+		if self.view is not None:
+			return self.view[offset : offset + length]
+		return disc_io.pread(self.file, length, offset)
+
+	def close(self):
+		if self._mmap is not None:
+			self.view.release()
+			self.view = None
+			try:
+				self._mmap.close()
+			# Descriptors still refer to the mapping, it is unmapped when they are gone
+			except BufferError:
+				pass
+			self._mmap = None
+		if self.owns_file:
+			self.file.close()
+
 
 # "2.1.5 Entity Identifier" of http://www.osta.org/specs/pdf/udf260.pdf
 class EntityIdType(object): # enum
@@ -208,30 +262,44 @@ class TagIdentifier(object): # enum
 	LogicalVolumeIntegrityDescriptor = 9
 	FileSetDescriptor = 256
 	FileIdentifierDescriptor = 257
+	AllocationExtentDescriptor = 258
 	FileEntry = 261
+	ExtendedFileEntry = 266
 
 
 # page 3/3 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
 # page 20 of http://www.osta.org/specs/pdf/udf260.pdf
 class DescriptorTag(BaseTag):
-	def __init__(self, buffer, start = 0):
+	def __init__(self, buffer, start = 0, validation = None):
 		super(DescriptorTag, self).__init__(16, buffer, start)
+		self.validation = validation
 
-		self.tag_identifier = to_uint16(buffer, start + 0)
-		self.descriptor_version = to_uint16(buffer, start + 2)
-		self.tag_check_sum = to_uint8(buffer, start + 4)
-		self.reserved = to_uint8(buffer, start + 5)
-		self.tag_serial_number = to_uint16(buffer, start + 6)
-		self.descriptor_crc = to_uint16(buffer, start + 8)
-		self.descriptor_crc_length = to_uint16(buffer, start + 10)
-		self.tag_location = to_uint32(buffer, start + 12)
+		(self.tag_identifier,
+		self.descriptor_version,
+		self.tag_check_sum,
+		self.reserved,
+		self.tag_serial_number,
+		self.descriptor_crc,
+		self.descriptor_crc_length,
+		self.tag_location) = DESCRIPTOR_TAG.unpack_from(buffer, start)
 
 		# Make sure the identifier is known
 		if self.tag_identifier == TagIdentifier.unknown:
 			raise Exception("Tag Identifier was unknown")
 
+		level = self._validation_level()
+		if level == VALIDATION_OFF:
+			return
+
 		self._assert_checksum(buffer, start, self.tag_check_sum)
-		self._assert_reserve_space(buffer, start + 5, 1)
+
+		if level == VALIDATION_STRICT:
+			self._assert_reserve_space(buffer, start + 5, 1)
+
+			# Only when the caller passed the whole descriptor, not just the tag
+			crc_start = start + 16
+			if len(buffer) >= crc_start + self.descriptor_crc_length:
+				self._assert_crc(buffer, crc_start, self.descriptor_crc_length, self.descriptor_crc)
 
 
 # page 3/3 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
@@ -245,10 +313,11 @@ class ExtentDescriptor(BaseTag):
 
 # page 3/15 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
 class AnchorVolumeDescriptorPointer(BaseTag):
-	def __init__(self, buffer, start = 0):
+	def __init__(self, buffer, start = 0, validation = None):
 		super(AnchorVolumeDescriptorPointer, self).__init__(512, buffer, start)
+		self.validation = validation
 
-		self.descriptor_tag = DescriptorTag(buffer, start)
+		self.descriptor_tag = DescriptorTag(buffer, start, validation)
 		self._assert_tag_identifier(TagIdentifier.AnchorVolumeDescriptorPointer)
 
 		self.main_volume_descriptor_sequence_extent = ExtentDescriptor(buffer, start + 16)
@@ -296,10 +365,11 @@ class Type1Partition(LogicalPartition):
 
 # page 4/17 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
 class FileSetDescriptor(BaseTag):
-	def __init__(self, buffer, start = 0):
+	def __init__(self, buffer, start = 0, validation = None):
 		super(FileSetDescriptor, self).__init__(512, buffer, start)
+		self.validation = validation
 
-		self.descriptor_tag = DescriptorTag(buffer, start)
+		self.descriptor_tag = DescriptorTag(buffer, start, validation)
 		self._assert_tag_identifier(TagIdentifier.FileSetDescriptor)
 
 		self.recording_date_and_time = buffer[start + 16 : start + 28] # FIXME: timestamp
@@ -326,10 +396,11 @@ class FileSetDescriptor(BaseTag):
 
 # page 3/12 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
 class PrimaryVolumeDescriptor(BaseTag):
-	def __init__(self, buffer, start = 0):
+	def __init__(self, buffer, start = 0, validation = None):
 		super(PrimaryVolumeDescriptor, self).__init__(512, buffer, start)
+		self.validation = validation
 
-		self.descriptor_tag = DescriptorTag(buffer, start)
+		self.descriptor_tag = DescriptorTag(buffer, start, validation)
 		self._assert_tag_identifier(TagIdentifier.PrimaryVolumeDescriptor)
 
 		self.volume_descriptor_sequence_number = to_uint32(buffer, start + 16)
@@ -360,10 +431,11 @@ class PrimaryVolumeDescriptor(BaseTag):
 # page 3/17 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
 # page 45 of http://www.osta.org/specs/pdf/udf260.pdf
 class PartitionDescriptor(BaseTag):
-	def __init__(self, buffer, start = 0):
+	def __init__(self, buffer, start = 0, validation = None):
 		super(PartitionDescriptor, self).__init__(512, buffer, start)
+		self.validation = validation
 
-		self.descriptor_tag = DescriptorTag(buffer, start)
+		self.descriptor_tag = DescriptorTag(buffer, start, validation)
 		self._assert_tag_identifier(TagIdentifier.PartitionDescriptor)
 
 		self.volume_descriptor_sequence_number = to_uint32(buffer, start + 16)
@@ -388,10 +460,11 @@ class PartitionDescriptor(BaseTag):
 # page 3/19 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
 # page 24 of http://www.osta.org/specs/pdf/udf260.pdf
 class LogicalVolumeDescriptor(BaseTag):
-	def __init__(self, buffer, start = 0):
+	def __init__(self, buffer, start = 0, validation = None):
 		super(LogicalVolumeDescriptor, self).__init__(512, buffer, start)
+		self.validation = validation
 
-		self.descriptor_tag = DescriptorTag(buffer, start)
+		self.descriptor_tag = DescriptorTag(buffer, start, validation)
 		self._assert_tag_identifier(TagIdentifier.LogicalVolumeDescriptor)
 
 		self.volume_descriptor_sequence_number = to_uint32(buffer, start + 16)
@@ -440,7 +513,9 @@ class LongAllocationDescriptor(BaseTag):
 	def __init__(self, buffer, start = 0):
 		super(LongAllocationDescriptor, self).__init__(16, buffer, start)
 
-		self.extent_length = to_uint32(buffer, start + 0)
+		length = to_uint32(buffer, start + 0)
+		self.extent_length = length & 0x3FFFFFFF
+		self.flags = (length >> 30) & 0x3
 		self.extent_location = LogicalBlockAddress(buffer, start + 4)
 		self.implementation_use = buffer[start + 10 : start + 16]
 
@@ -496,13 +571,21 @@ class Type2PartitionMap(BaseTag):
 # page 4/28 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
 # page 56 of http://www.osta.org/specs/pdf/udf260.pdf
 class FileEntry(BaseTag):
-	def __init__(self, buffer, start = 0):
-		super(FileEntry, self).__init__(300, buffer, start) # FIXME: How do we deal with this having a dynamic size?
-
-		self.descriptor_tag = DescriptorTag(buffer, start)
+	# Offsets of the fields that are only decoded when they are used
+	_ACCESS_DATE_AND_TIME = 72
+	_MODIFICATION_DATE_AND_TIME = 84
+	_ATTRIBUTE_DATE_AND_TIME = 96
+	_EXTENDED_ATTRIBUTE_ICB = 112
+	_IMPLEMENTATION_IDENTIFIER = 128
+
+	def __init__(self, buffer, start = 0, validation = None):
+		super(FileEntry, self).__init__(176, buffer, start)
+		self.validation = validation
+
+		self.descriptor_tag = DescriptorTag(buffer, start, validation)
 		self._assert_tag_identifier(TagIdentifier.FileEntry)
 
-		self.icb_tag = ICBTag(buffer, start + 16)
+		self.icb_tag = ICBTag(buffer, start + 16, validation)
 		self.uid = to_uint32(buffer, start + 36)
 		self.gid = to_uint32(buffer, start + 40)
 		self.permissions = to_uint32(buffer, start + 44)
@@ -512,17 +595,108 @@ class FileEntry(BaseTag):
 		self.record_length = to_uint32(buffer, start + 52)
 		self.information_length = to_uint64(buffer, start + 56)
 		self.logical_blocks_recorded = to_uint64(buffer, start + 64)
-		self.access_date_and_time = buffer[start + 72 : start + 84] # FIXME: timestamp
-		self.modification_date_and_time = buffer[start + 84 : start + 96] # FIXME: timestamp
-		self.attribute_date_and_time = buffer[start + 96 : start + 108] # FIXME: timestamp
 		self.checkpoint = to_uint32(buffer, start + 108)
-		self.extended_attribute_icb = LongAllocationDescriptor(buffer, start + 112)
-		self.implementation_identifier = EntityID(EntityIdType.ImplementationIdentifier, buffer, start + 128)
 		self.uinque_id = to_uint64(buffer, start + 160)
 		self.length_of_extended_attributes = to_uint32(buffer, start + 168)
-		self.length_of_allocation_descriptors = to_uint32(buffer, start + 173)
-		self.extended_attributes = buffer[start + 176 : start + 176 + self.length_of_extended_attributes]
-		self.allocation_descriptors = buffer[start + 176 + self.length_of_extended_attributes : start + 176 + self.length_of_extended_attributes + self.length_of_allocation_descriptors]
+		self.length_of_allocation_descriptors = to_uint32(buffer, start + 172)
+		self._read_tail(buffer, start, 176)
+
+	# The descriptor ends with variable length extended attributes and allocation descriptors
+	def _read_tail(self, buffer, start, header_size):
+		self._buffer = buffer
+		self._start = start
+		self._header_size = header_size
+		ad_start = start + header_size + self.length_of_extended_attributes
+		self._size = header_size + self.length_of_extended_attributes + self.length_of_allocation_descriptors
+		self._assert_size(buffer, start)
+
+		self.allocation_descriptors = buffer[ad_start : ad_start + self.length_of_allocation_descriptors]
+
+	def _get_field(self, offset, length):
+		return self._buffer[self._start + offset : self._start + offset + length]
+
+	def get_access_date_and_time(self):
+		return self._get_field(self._ACCESS_DATE_AND_TIME, 12) # FIXME: timestamp
+	access_date_and_time = property(get_access_date_and_time)
+
+	def get_modification_date_and_time(self):
+		return self._get_field(self._MODIFICATION_DATE_AND_TIME, 12) # FIXME: timestamp
+	modification_date_and_time = property(get_modification_date_and_time)
+
+	def get_attribute_date_and_time(self):
+		return self._get_field(self._ATTRIBUTE_DATE_AND_TIME, 12) # FIXME: timestamp
+	attribute_date_and_time = property(get_attribute_date_and_time)
+
+	def get_extended_attribute_icb(self):
+		return LongAllocationDescriptor(self._buffer, self._start + self._EXTENDED_ATTRIBUTE_ICB)
+	extended_attribute_icb = property(get_extended_attribute_icb)
+
+	def get_implementation_identifier(self):
+		return EntityID(EntityIdType.ImplementationIdentifier, self._buffer, self._start + self._IMPLEMENTATION_IDENTIFIER)
+	implementation_identifier = property(get_implementation_identifier)
+
+	def get_extended_attributes(self):
+		return self._get_field(self._header_size, self.length_of_extended_attributes)
+	extended_attributes = property(get_extended_attributes)
+
+
+# page 4/43 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
+# UDF 2.00+ writes these instead of File Entries; the fields used here are the same
+class ExtendedFileEntry(FileEntry):
+	_ACCESS_DATE_AND_TIME = 80
+	_MODIFICATION_DATE_AND_TIME = 92
+	_CREATION_DATE_AND_TIME = 104
+	_ATTRIBUTE_DATE_AND_TIME = 116
+	_EXTENDED_ATTRIBUTE_ICB = 136
+	_STREAM_DIRECTORY_ICB = 152
+	_IMPLEMENTATION_IDENTIFIER = 168
+
+	def __init__(self, buffer, start = 0, validation = None):
+		BaseTag.__init__(self, 216, buffer, start)
+		self.validation = validation
+
+		self.descriptor_tag = DescriptorTag(buffer, start, validation)
+		self._assert_tag_identifier(TagIdentifier.ExtendedFileEntry)
+
+		self.icb_tag = ICBTag(buffer, start + 16, validation)
+		self.uid = to_uint32(buffer, start + 36)
+		self.gid = to_uint32(buffer, start + 40)
+		self.permissions = to_uint32(buffer, start + 44)
+		self.file_link_count = to_uint16(buffer, start + 48)
+		self.record_format = to_uint8(buffer, start + 50)
+		self.record_display_attributes = to_uint8(buffer, start + 51)
+		self.record_length = to_uint32(buffer, start + 52)
+		self.information_length = to_uint64(buffer, start + 56)
+		self.object_size = to_uint64(buffer, start + 64)
+		self.logical_blocks_recorded = to_uint64(buffer, start + 72)
+		self.checkpoint = to_uint32(buffer, start + 128)
+		self.uinque_id = to_uint64(buffer, start + 200)
+		self.length_of_extended_attributes = to_uint32(buffer, start + 208)
+		self.length_of_allocation_descriptors = to_uint32(buffer, start + 212)
+		self._read_tail(buffer, start, 216)
+
+	def get_creation_date_and_time(self):
+		return self._get_field(self._CREATION_DATE_AND_TIME, 12) # FIXME: timestamp
+	creation_date_and_time = property(get_creation_date_and_time)
+
+	def get_stream_directory_icb(self):
+		return LongAllocationDescriptor(self._buffer, self._start + self._STREAM_DIRECTORY_ICB)
+	stream_directory_icb = property(get_stream_directory_icb)
+
+
+# page 4/32 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
+# Continues the allocation descriptors of a file that did not fit in its File Entry
+class AllocationExtentDescriptor(BaseTag):
+	def __init__(self, buffer, start = 0, validation = None):
+		super(AllocationExtentDescriptor, self).__init__(24, buffer, start)
+		self.validation = validation
+
+		self.descriptor_tag = DescriptorTag(buffer, start, validation)
+		self._assert_tag_identifier(TagIdentifier.AllocationExtentDescriptor)
+
+		self.previous_allocation_extent_location = to_uint32(buffer, start + 16)
+		self.length_of_allocation_descriptors = to_uint32(buffer, start + 20)
+		self.allocation_descriptors = buffer[start + 24 : start + 24 + self.length_of_allocation_descriptors]
 
 
 # page 4/25 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
@@ -546,8 +720,9 @@ class FileType(object): # enum
 # page 4/23 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
 # "2.3.5 ICB Tag" of http://www.osta.org/specs/pdf/udf260.pdf
 class ICBTag(BaseTag):
-	def __init__(self, buffer, start = 0):
+	def __init__(self, buffer, start = 0, validation = None):
 		super(ICBTag, self).__init__(20, buffer, start)
+		self.validation = validation
 
 		self.prior_recorded_number_of_direct_entries = to_uint32(buffer, start)
 		self.strategy_type = to_uint16(buffer, start + 4)
@@ -555,13 +730,18 @@ class ICBTag(BaseTag):
 		self.maximum_number_of_entries = to_uint16(buffer, start + 8)
 		self.reserved = buffer[start + 10: start + 11]
 		self.file_type = to_uint8(buffer, start + 11)
-		self.parent_icb_location = LogicalBlockAddress(buffer, start + 12)
+		self._buffer = buffer
+		self._start = start
 		raw_flags = to_uint16(buffer, start + 18)
 		self.allocation_type = raw_flags & 0x3
 		self.flags = raw_flags & 0xFFFC
 
 		self._assert_reserve_space(buffer, start + 10, 1)
 
+	def get_parent_icb_location(self):
+		return LogicalBlockAddress(self._buffer, self._start + 12)
+	parent_icb_location = property(get_parent_icb_location)
+
 
 class CookedExtent(object):
 	def __init__(self, file_content_offset, partition, start_pos, length):
@@ -587,6 +767,14 @@ class AllocationType(object): # enum
 	embedded = 3
 
 
+# page 4/14 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
+class ExtentType(object): # enum
+	recorded = 0
+	allocated_not_recorded = 1
+	not_allocated = 2
+	next_extent = 3 # the extent holds more allocation descriptors
+
+
 class FileContentBuffer(object):
 	def __init__(self, context, partition, file_entry, block_size):
 		self.context = context
@@ -594,6 +782,7 @@ class FileContentBuffer(object):
 		self.file_entry = file_entry
 		self.block_size = block_size
 		self.extents = None
+		self.extent_offsets = None # file_content_offset of each extent, for bisect
 
 		self.load_extents()
 
@@ -601,79 +790,159 @@ class FileContentBuffer(object):
 		self.extents = []
 		active_buffer = self.file_entry.allocation_descriptors
 
-		# Short descriptors
 		alloc_type = self.file_entry.icb_tag.allocation_type
-		if alloc_type == AllocationType.short_descriptors:
+		if alloc_type == AllocationType.embedded:
+			# The content is stored in the File Entry itself, see read()
+			pass
+		elif alloc_type in [AllocationType.short_descriptors, AllocationType.long_descriptors]:
+			is_long = alloc_type == AllocationType.long_descriptors
+			ad_size = 16 if is_long else 8
 			file_pos = 0
+			followed = 0
 			i = 0
-			while i < len(active_buffer):
-				sad = ShortAllocationDescriptor(active_buffer, i)
-				if sad.extent_length == 0:
+			while i + ad_size <= len(active_buffer):
+				# Short descriptors point into the partition of the File Entry, long ones into any partition
+				if is_long:
+					ad = LongAllocationDescriptor(active_buffer, i)
+					partition = ad.extent_location.partition_reference_number
+					block = ad.extent_location.logical_block_number
+				else:
+					ad = ShortAllocationDescriptor(active_buffer, i)
+					partition = MAX_INT
+					block = ad.extent_location
+				i += ad_size
+
+				if ad.extent_length == 0:
 					break
-				if sad.flags != 0:
-					raise NotImplementedError("Can't use extents that are not recorded and allocated.")
-
-				new_extent = CookedExtent(file_pos, MAX_INT, sad.extent_location * self.block_size, sad.extent_length)
-				self.extents.append(new_extent)
-				file_pos += sad.extent_length
-				i += sad.size
-		elif alloc_type == AllocationType.embedded:
-			raise NotImplementedError()
-		elif alloc_type == AllocationType.long_descriptors:
-			raise NotImplementedError()
+
+				# Continue with the descriptors in an Allocation Extent Descriptor
+				if ad.flags == ExtentType.next_extent:
+					followed += 1
+					if followed > MAX_ALLOCATION_EXTENTS:
+						raise Exception("File has more than {0} allocation extents".format(MAX_ALLOCATION_EXTENTS))
+					active_buffer = self._read_allocation_extent(partition, block, ad.extent_length)
+					i = 0
+					continue
+
+				# Extents that are not recorded read as zeros
+				start_pos = None
+				if ad.flags == ExtentType.recorded:
+					start_pos = block * self._get_partition(partition).logical_block_size
+
+				self.add_extent(CookedExtent(file_pos, partition, start_pos, ad.extent_length))
+				file_pos += ad.extent_length
 		else:
 			raise NotImplementedError("FIXME: Add support for allocation type {0}".format(alloc_type))
 
+		self.extent_offsets = [extent.file_content_offset for extent in self.extents]
+
+	def _get_partition(self, partition):
+		if partition != MAX_INT:
+			return self.context.logical_partitions[partition]
+		return self.partition
+
+	def _read_allocation_extent(self, partition, block, length):
+		part = self._get_partition(partition)
+		offset = part.physical_partition._start + block * part.logical_block_size
+		buffer = self.context.read(offset, length)
+		return AllocationExtentDescriptor(buffer, 0, self.context.validation).allocation_descriptors
+
+	# Merge extents that continue each other on disc, so they are read in one go
+	def add_extent(self, extent):
+		if self.extents:
+			last = self.extents[-1]
+			if last.partition == extent.partition and \
+				last.start_pos is not None and extent.start_pos is not None and \
+				last.start_pos + last.length == extent.start_pos and \
+				last.file_content_offset + last.length == extent.file_content_offset:
+				last.length += extent.length
+				return
+
+		self.extents.append(extent)
+
 	def get_capacity(self):
 		return self.file_entry.information_length
 	capacity = property(get_capacity)
 
+	# Returns up to count bytes of the content starting at pos (offset is unused
+	# and kept for compatibility with the original DiscUtils signature)
 	def read(self, pos, offset, count):
-		buffer = []
 		if self.file_entry.icb_tag.allocation_type == AllocationType.embedded:
 			src_buffer = self.file_entry.allocation_descriptors
 			if pos > len(src_buffer):
-				return buffer
+				return b''
 
 			to_copy = min(len(src_buffer) - pos, count)
-			buffer[offset : offset + to_copy] = src_buffer[pos : pos + to_copy]
-			return buffer
+			return bytes(src_buffer[pos : pos + to_copy])
 		else:
 			return self.read_from_extents(pos, offset, count)
 
 	def read_from_extents(self, pos, offset, count):
-		total_to_read = min(self.capacity - pos, count)
+		total_to_read = max(0, min(self.capacity - pos, count))
 		total_read = 0
-		buffer = []
+		buffer = bytearray(total_to_read)
+		view = memoryview(buffer)
 
 		while total_read < total_to_read:
 			extent = self.find_extent(pos + total_read)
+			if extent is None:
+				break
 
 			extent_offset = (pos + total_read) - extent.file_content_offset
 			to_read = min(total_to_read - total_read, extent.length - extent_offset)
 
-			part = None
-			if extent.partition != MAX_INT:
-				part = self.logical_partitions[extent.partition]
-			else:
-				part = self.partition
+			# Not recorded, the buffer is already zeroed
+			if extent.start_pos is None:
+				total_read += to_read
+				continue
+
+			part = self._get_partition(extent.partition)
 
 			new_pos = extent.start_pos + extent_offset + part.physical_partition._start
-			part.physical_partition._file.seek(new_pos)
-			buffer = part.physical_partition._file.read(to_read)
-			if len(buffer) == 0:
-				return buffer
+			if self.context.view is not None:
+				# Copy straight from the mapping
+				read = max(0, min(to_read, len(self.context.view) - new_pos))
+				view[total_read : total_read + read] = self.context.view[new_pos : new_pos + read]
+			else:
+				# Positioned read: the image handle may be shared between threads
+				read = disc_io.preadinto(part.physical_partition._file, view[total_read : total_read + to_read], new_pos)
+			if not read:
+				break
 
-			total_read += len(buffer)
+			total_read += read
 
+		view.release()
+		if total_read < total_to_read:
+			del buffer[total_read:]
 		return buffer
 
+	# Like read(), but returns a memoryview; of the mapping itself, without
+	# copying, when the range lies in one recorded extent of a mapped image
+	def read_view(self, pos, count):
+		count = max(0, min(self.capacity - pos, count))
+		if self.file_entry.icb_tag.allocation_type == AllocationType.embedded:
+			return memoryview(self.file_entry.allocation_descriptors)[pos : pos + count]
+
+		if self.context.view is not None:
+			extent = self.find_extent(pos)
+			if extent is not None and extent.start_pos is not None and \
+				pos + count <= extent.file_content_offset + extent.length:
+				part = self._get_partition(extent.partition)
+				start = part.physical_partition._start + extent.start_pos + (pos - extent.file_content_offset)
+				if start + count <= len(self.context.view):
+					return self.context.view[start : start + count]
+
+		return memoryview(self.read(pos, 0, count))
+
 	def find_extent(self, pos):
-		for extent in self.extents:
-			if extent.file_content_offset + extent.length > pos:
-				return extent
+		i = bisect_right(self.extent_offsets, pos) - 1
+		if i < 0:
+			return None
 
-		return None
+		extent = self.extents[i]
+		if pos >= extent.file_content_offset + extent.length:
+			return None
+		return extent
 
 
 class File(object):
@@ -689,13 +958,16 @@ class File(object):
 		partition = context.logical_partitions[icb.extent_location.partition_reference_number]
 		root_data_dir = read_extent(context, icb)
 
-		dt = DescriptorTag(root_data_dir)
-		if dt.tag_identifier == TagIdentifier.FileEntry:
-			file_entry = FileEntry(root_data_dir)
+		dt = DescriptorTag(root_data_dir, 0, context.validation)
+		if dt.tag_identifier in [TagIdentifier.FileEntry, TagIdentifier.ExtendedFileEntry]:
+			if dt.tag_identifier == TagIdentifier.ExtendedFileEntry:
+				file_entry = ExtendedFileEntry(root_data_dir, 0, context.validation)
+			else:
+				file_entry = FileEntry(root_data_dir, 0, context.validation)
 			if file_entry.icb_tag.file_type == FileType.directory:
 				return Directory(context, partition, file_entry)
 			else:
-				raise NotImplementedError("FIXME: Expected a directory not a FileType of {0}".format(file_entry.icb_tag.file_type))
+				return File(context, partition, file_entry, partition.logical_block_size)
 		else:
 			raise NotImplementedError("FIXME: Add the code for handling Tag Identifier {0}".format(dt.tag_identifier))
 
@@ -707,6 +979,10 @@ class File(object):
 		return self.content
 	file_content = property(get_file_content)
 
+	def get_is_directory(self):
+		return self.file_entry.icb_tag.file_type == FileType.directory
+	is_directory = property(get_is_directory)
+
 
 class FileCharacteristic(object): # enum
 	existence = 0x01
@@ -718,27 +994,47 @@ class FileCharacteristic(object): # enum
 
 # page 4/21 of http://www.ecma-international.org/publications/files/ECMA-ST/Ecma-167.pdf
 class FileIdentifierDescriptor(BaseTag):
-	def __init__(self, buffer, start = 0):
+	def __init__(self, buffer, start = 0, validation = None):
 		super(FileIdentifierDescriptor, self).__init__(0, buffer, start)
+		self.validation = validation
 
 		self.rounded_size = 0
 
-		self.descriptor_tag = DescriptorTag(buffer, start)
+		self.descriptor_tag = DescriptorTag(buffer, start, validation)
 		self._assert_tag_identifier(TagIdentifier.FileIdentifierDescriptor)
 
-		self.file_version_number = to_uint16(buffer, start + 16)
-		self.file_characteristics = to_uint8(buffer, start + 18)
-		self.length_of_file_identifier = to_uint8(buffer, start + 19)
-		self.ICB = LongAllocationDescriptor(buffer, start + 20)
-		self.length_of_implementation_use = to_uint16(buffer, start + 36)
-		self.implementation_use = buffer[start + 38 : start + 38 + self.length_of_implementation_use]
+		(self.file_version_number,
+		self.file_characteristics,
+		self.length_of_file_identifier,
+		self.length_of_implementation_use) = FILE_IDENTIFIER_HEADER.unpack_from(buffer, start + 16)
+		self._buffer = buffer
+		self._start = start
+		self._icb = None
 
 		s = start + 38 + self.length_of_implementation_use
 		l = self.length_of_file_identifier
+		self._file_identifier_start = s
 		self.file_identifier = to_dchars(buffer, s, l)
 
 		self.rounded_size = round_up(38 + self.length_of_implementation_use + self.length_of_file_identifier, 4)
 
+	# Only needed to open the entry, so it is decoded on first use
+	def get_ICB(self):
+		if self._icb is None:
+			self._icb = LongAllocationDescriptor(self._buffer, self._start + 20)
+		return self._icb
+	ICB = property(get_ICB)
+
+	def get_implementation_use(self):
+		return self._buffer[self._start + 38 : self._start + 38 + self.length_of_implementation_use]
+	implementation_use = property(get_implementation_use)
+
+	# The identifier as recorded: the CS0 compression ID followed by the characters
+	def get_raw_file_identifier(self):
+		s = self._file_identifier_start
+		return bytes(self._buffer[s : s + self.length_of_file_identifier])
+	raw_file_identifier = property(get_raw_file_identifier)
+
 
 class Directory(File):
 	def __init__(self, context, partition, file_entry):
@@ -747,14 +1043,17 @@ class Directory(File):
 			raise NotImplementedError("Directory too big")
 
 		self._entries = []
-		content_bytes = self.file_content.read(0, 0, self.file_content.capacity)
+		self._index = {}    # upper case name -> FileIdentifierDescriptor
+		self._children = {} # upper case name -> File or Directory, loaded on first use
+		content_bytes = self.file_content.read_view(0, self.file_content.capacity)
 
 		pos = 0
 		while pos < len(content_bytes):
-			id = FileIdentifierDescriptor(content_bytes, int(pos))
+			id = FileIdentifierDescriptor(content_bytes, int(pos), self.context.validation)
 
 			if (id.file_characteristics & (FileCharacteristic.deleted | FileCharacteristic.parent)) == 0:
 				self._entries.append(id)
+				self._index.setdefault(id.file_identifier.upper(), id)
 
 			pos += id.rounded_size
 
@@ -762,74 +1061,200 @@ class Directory(File):
 		return self._entries
 	all_entries = property(get_all_entries)
 
+	# Case-insensitive lookup of a child's File Identifier Descriptor (name is str, or UTF-8 bytes)
+	def get_entry(self, name):
+		if isinstance(name, bytes):
+			name = name.decode('utf-8')
+		return self._index.get(name.upper())
+
+	# The child File or Directory; subdirectories are parsed on first access only
+	def get_child(self, name):
+		if isinstance(name, bytes):
+			name = name.decode('utf-8')
+		key = name.upper()
+		child = self._children.get(key)
+		if child is None:
+			id = self._index.get(key)
+			if id is None:
+				return None
+			child = File.from_descriptor(self.context, id.ICB)
+			self._children[key] = child
+		return child
+
+
+UdfStat = namedtuple('UdfStat', ['name', 'size', 'is_directory', 'file_type', 'unique_id'])
+
+
+class UdfFile(io.RawIOBase):
+	"""Seekable read-only file object over the content of a UDF file"""
+
+	def __init__(self, file, name=None):
+		super(UdfFile, self).__init__()
+		self._content = file.file_content
+		self._pos = 0
+		self.name = name
+
+	def readable(self):
+		return True
+
+	def seekable(self):
+		return True
+
+	def tell(self):
+		return self._pos
+
+	def seek(self, offset, whence=io.SEEK_SET):
+		if whence == io.SEEK_SET:
+			pos = offset
+		elif whence == io.SEEK_CUR:
+			pos = self._pos + offset
+		elif whence == io.SEEK_END:
+			pos = self._content.capacity + offset
+		else:
+			raise ValueError("invalid whence ({0})".format(whence))
+		if pos < 0:
+			raise ValueError("negative seek position {0}".format(pos))
+		self._pos = pos
+		return pos
+
+	def readinto(self, b):
+		data = self._content.read(self._pos, 0, len(b))
+		n = len(data)
+		memoryview(b).cast('B')[:n] = data
+		self._pos += n
+		return n
+
+
+class UdfFileSystem(object):
+	"""A mounted UDF volume with path based access; see open_udf()"""
+
+	def __init__(self, root):
+		self.root = root
+		self.context = root.context
+
+	def close(self):
+		self.context.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	@staticmethod
+	def _split(path):
+		if isinstance(path, bytes):
+			path = path.decode('utf-8')
+		return [part for part in path.split(u'/') if part]
+
+	# Like os.listdir, names are bytes (UTF-8) when the path was given as bytes
+	@staticmethod
+	def _name(name, path):
+		if isinstance(path, bytes):
+			return name.encode('utf-8')
+		return name
+
+	# Returns the File or Directory at path, or raises IOError
+	def lookup(self, path):
+		current = self.root
+		for name in self._split(path):
+			child = current.get_child(name) if isinstance(current, Directory) else None
+			if child is None:
+				raise IOError("Path not found: {0}".format(path))
+			current = child
+		return current
+
+	def listdir(self, path = b'/'):
+		directory = self.lookup(path)
+		if not isinstance(directory, Directory):
+			raise IOError("Not a directory: {0}".format(path))
+		return [self._name(id.file_identifier, path) for id in directory.all_entries]
+
+	def stat(self, path):
+		file = self.lookup(path)
+		parts = self._split(path)
+		name = u''
+		if parts:
+			# The name as recorded, not as spelled in path
+			name = self.lookup(u'/'.join(parts[:-1])).get_entry(parts[-1]).file_identifier
+		return UdfStat(
+			self._name(name, path),
+			file.file_entry.information_length,
+			file.is_directory,
+			file.file_entry.icb_tag.file_type,
+			file.file_entry.uinque_id,
+		)
+
+	def open(self, path):
+		file = self.lookup(path)
+		if file.is_directory:
+			raise IOError("Is a directory: {0}".format(path))
+		return UdfFile(file, name=path)
+
+	def get_file(self, path):
+		file = self.lookup(path)
+		if file.is_directory:
+			raise IOError("Is a directory: {0}".format(path))
+		return bytes(file.file_content.read(0, 0, file.file_content.capacity))
+
 
 def read_extent(context, extent):
 	partition = context.logical_partitions[extent.extent_location.partition_reference_number]
 	offset = partition.physical_partition._start
 	pos = extent.extent_location.logical_block_number * partition.logical_block_size
 	length = extent.extent_length
-	context.file.seek(offset + pos)
-	retval = context.file.read(length)
-	return retval
+	return context.read(offset + pos, length)
 
 
 # FIXME: This assumes the sector size is 2048
 def is_valid_udf(file, file_size):
-	# Move to the start of the file
-	file.seek(0)
-
 	# Make sure there is enough space for a header and sector
 	if file_size < HEADER_SIZE + SECTOR_SIZE:
 		return False
 
-	# Move past 32K of empty space
-	file.seek(HEADER_SIZE)
-
-	is_valid = True
 	has_bea, has_vsd, has_tea = False, False, False
 
-	# Look at each sector
-	while(is_valid):
-		# Read the next sector
-		buffer = file.read(SECTOR_SIZE)
-		if len(buffer) < SECTOR_SIZE:
-			break
-
-		# Get the sector meta data
-		structure_type = to_uint8(buffer, 0)
-		standard_identifier = buffer[1 : 6]
-		structure_version = to_uint8(buffer, 6)
-
-		# Check if we have the beginning, middle, or end
-		if standard_identifier in [b'BEA01']:
-			has_bea = True
-		elif standard_identifier in [b'NSR02', b'NSR03']:
-			has_vsd = True
-		elif standard_identifier in [b'TEA01']:
-			has_tea = True
-		elif standard_identifier in [b'BOOT2', b'CD001', b'CDW02']:
-			pass
-		else:
-			is_valid = False
+	# Read the Volume Recognition Sequence after the 32K of empty space in
+	# batches of sectors, and look at each sector in memory
+	offset = HEADER_SIZE
+	while True:
+		buffer = disc_io.pread(file, VRS_BATCH_SECTORS * SECTOR_SIZE, offset)
+		offset += len(buffer)
+
+		for pos in range(0, len(buffer) - SECTOR_SIZE + 1, SECTOR_SIZE):
+			# Get the sector meta data
+			standard_identifier = buffer[pos + 1 : pos + 6]
+
+			# Check if we have the beginning, middle, or end
+			if standard_identifier in [b'BEA01']:
+				has_bea = True
+			elif standard_identifier in [b'NSR02', b'NSR03']:
+				has_vsd = True
+			elif standard_identifier in [b'TEA01']:
+				has_tea = True
+			elif standard_identifier in [b'BOOT2', b'CD001', b'CDW02']:
+				pass
+			else:
+				return has_bea and has_vsd and has_tea
 
-	return has_bea and has_vsd and has_tea
+		# The end of the file
+		if len(buffer) < VRS_BATCH_SECTORS * SECTOR_SIZE:
+			return has_bea and has_vsd and has_tea
 
 
-def get_sector_size(file, file_size):
+# Returns the sector size and the 512 bytes of the Anchor Volume Descriptor Pointer at sector 256
+def _read_anchor(file, file_size, validation = None):
 	sizes = [4096, 2048, 1024, 512]
 	for size in sizes:
 		# Skip this size if the file is too small for all the sectors
 		if file_size < 257 * size:
 			continue
 
-		# Move to the last sector
-		file.seek(256 * size)
-
-		# Read the Descriptor Tag
-		buffer = file.read(16)
+		# Read the anchor candidate in one call, the tag is its first 16 bytes
+		buffer = disc_io.pread(file, 512, 256 * size)
 		tag = None
 		try:
-			tag = DescriptorTag(buffer)
+			tag = DescriptorTag(buffer[0 : 16], 0, validation)
 		# Skip if the tag is not valid
 		except:
 			continue
@@ -843,101 +1268,124 @@ def get_sector_size(file, file_size):
 			continue
 
 		# Got the correct size
-		return size
+		return size, buffer
 
 	raise Exception("Could not get file sector size.")
 
 
-def read_udf_file(file_name):
-	# Make sure the file exists
-	if not os.path.isfile(file_name):
-		raise Exception("No such file '{0}'".format(file_name))
-
-	# Open the file
-	file_size = os.path.getsize(file_name)
-	file = open(file_name, 'rb')
-
-	# Make sure the file is valid UDF
-	if not is_valid_udf(file, file_size):
-		raise Exception("Is not a valid UDF file '{0}'".format(file_name))
+def get_sector_size(file, file_size):
+	return _read_anchor(file, file_size)[0]
 
-	# Make sure the file can fit all the sectors
-	sector_size = get_sector_size(file, file_size)
-	if file_size < 257 * sector_size:
-		raise Exception("File is too small to hold all sectors '{0}'".format(file_name))
 
-	# "5.2 UDF Volume Structure and Mount Procedure" of https://sites.google.com/site/udfintro/
-	# Read the Anchor VD Pointer
-	context = UdfContext(file, sector_size)
-	sector = 256
-	file.seek(sector * sector_size)
-	buffer = file.read(512)
-	tag = DescriptorTag(buffer[0 : 16])
-	if not tag.tag_identifier == TagIdentifier.AnchorVolumeDescriptorPointer:
-		raise Exception("The last sector was supposed to be an Archive Volume Descriptor, but was not.")
-	avdp = AnchorVolumeDescriptorPointer(buffer)
-	
-	# Get the location of the primary volume descriptor
-	pvd_sector = avdp.main_volume_descriptor_sequence_extent.extent_location
-		
-	# Look through all the sectors and find the partition descriptor
-	logical_volume_descriptor = None
-	terminating_descriptor = None
-	for sector in range(pvd_sector, 257):
-		# Move to the sector start
-		file.seek(sector * sector_size)
+# Reads a whole volume descriptor sequence extent with one call and parses it in memory
+def _read_volume_descriptor_sequence(context, extent, file_size):
+	sector_size = context.physical_sector_size
+	start = extent.extent_location * sector_size
+	# The sequence is at least 16 sectors long (ECMA-167 3/8.4.2), but do
+	# not trust a broken length to read the whole image
+	length = max(extent.extent_length, 16 * sector_size)
+	length = min(length, MAX_VDS_SECTORS * sector_size, file_size - start)
+	buffer = disc_io.pread(context.file, length, start) if length > 0 else b''
 
+	descriptors = {}
+	for pos in range(0, len(buffer) - 512 + 1, sector_size):
 		# Read the Descriptor Tag
-		buffer = file.read(16)
 		tag = None
 		try:
-			tag = DescriptorTag(buffer)
+			tag = DescriptorTag(buffer, pos, context.validation)
 		# Skip if not valid
 		except:
 			continue
 
-		# Move back to the start of the sector
-		file.seek(sector * sector_size)
-		buffer = file.read(512)
-
-		if tag.tag_identifier == TagIdentifier.PrimaryVolumeDescriptor:
-			desc = PrimaryVolumeDescriptor(buffer)
-		elif tag.tag_identifier == TagIdentifier.AnchorVolumeDescriptorPointer:
-			anchor = AnchorVolumeDescriptorPointer(buffer)
-		elif tag.tag_identifier == TagIdentifier.VolumeDescriptorPointer:
-			pass #VolumeDescriptorPointer(buffer)
-		elif tag.tag_identifier == TagIdentifier.ImplementationUseVolumeDescriptor:
-			pass #ImplementationUseVolumeDescriptor(buffer)
-		elif tag.tag_identifier == TagIdentifier.PartitionDescriptor:
-			partition_descriptor = PartitionDescriptor(buffer)
-			start = partition_descriptor.partition_starting_location * sector_size
-			length = partition_descriptor.partition_length * sector_size
-			physical_partition = PhysicalPartition(file, start, length)
-			context.physical_partitions[partition_descriptor.partition_number] = physical_partition
-		elif tag.tag_identifier == TagIdentifier.LogicalVolumeDescriptor:
-			logical_volume_descriptor = LogicalVolumeDescriptor(buffer)
-		elif tag.tag_identifier == TagIdentifier.UnallocatedSpaceDescriptor:
-			pass #UnallocatedSpaceDescriptor(buffer)
-		elif tag.tag_identifier == TagIdentifier.TerminatingDescriptor:
-			terminating_descriptor = TerminatingDescriptor(buffer)
-		elif tag.tag_identifier == TagIdentifier.LogicalVolumeIntegrityDescriptor:
-			pass #LogicalVolumeIntegrityDescriptor(buffer)
+		if tag.tag_identifier in [TagIdentifier.PrimaryVolumeDescriptor, TagIdentifier.PartitionDescriptor,
+				TagIdentifier.LogicalVolumeDescriptor, TagIdentifier.TerminatingDescriptor]:
+			descriptors.setdefault(tag.tag_identifier, (buffer, pos))
+		elif tag.tag_identifier in [TagIdentifier.AnchorVolumeDescriptorPointer,
+				TagIdentifier.VolumeDescriptorPointer, TagIdentifier.ImplementationUseVolumeDescriptor,
+				TagIdentifier.UnallocatedSpaceDescriptor, TagIdentifier.LogicalVolumeIntegrityDescriptor]:
+			pass
 		elif tag.tag_identifier != 0:
 			raise NotImplementedError("Unexpected Descriptor Tag :{0}".format(tag.tag_identifier))
 
-		if logical_volume_descriptor and partition_descriptor and terminating_descriptor:
+		if tag.tag_identifier == TagIdentifier.TerminatingDescriptor:
 			break
 
+	return descriptors
+
+
+def read_udf_file(file_name, use_mmap = False, file = None, validation = None):
+	# An already open image (file) is shared: it is read but never closed here
+	if validation is not None:
+		_check_validation_level(validation)
+	owns_file = file is None
+	if owns_file:
+		# Make sure the file exists (remote images are checked by the first read)
+		if not disc_io.is_url(file_name) and not os.path.isfile(file_name):
+			raise Exception("No such file '{0}'".format(file_name))
+
+		# Open the file (raw 2352-byte BIN is translated to 2048-byte sectors).
+		# It stays open in root.context for lazy reads (root.context.close() releases it); on errors it is closed here
+		file = disc_io.open_image(file_name)
+
+	try:
+		return _mount(file, file_name, use_mmap, owns_file, validation)
+	except BaseException:
+		if owns_file:
+			file.close()
+		raise
+
+
+def _mount(file, file_name, use_mmap, owns_file, validation):
+	file_size = disc_io.get_size(file)
+
+	# Make sure the file is valid UDF
+	if not is_valid_udf(file, file_size):
+		raise Exception("Is not a valid UDF file '{0}'".format(file_name))
+
+	# "5.2 UDF Volume Structure and Mount Procedure" of https://sites.google.com/site/udfintro/
+	# Read the Anchor VD Pointer, which also tells the sector size
+	sector_size, buffer = _read_anchor(file, file_size, validation)
+	context = UdfContext(file, sector_size, use_mmap, owns_file = False, validation = validation)
+	try:
+		root = _mount_volume(context, buffer, file_size)
+	except BaseException:
+		context.close()
+		raise
+	context.owns_file = owns_file
+	return root
+
+
+def _mount_volume(context, buffer, file_size):
+	file = context.file
+	sector_size = context.physical_sector_size
+	validation = context.validation
+	avdp = AnchorVolumeDescriptorPointer(buffer, 0, validation)
+
+	# Find the partition and logical volume descriptors in the main sequence,
+	# and fall back to the reserve copy if the main one is damaged
+	required = [TagIdentifier.PartitionDescriptor, TagIdentifier.LogicalVolumeDescriptor, TagIdentifier.TerminatingDescriptor]
+	descriptors = _read_volume_descriptor_sequence(context, avdp.main_volume_descriptor_sequence_extent, file_size)
+	if not all(identifier in descriptors for identifier in required):
+		reserve = _read_volume_descriptor_sequence(context, avdp.reserve_volume_descriptor_sequence_extent, file_size)
+		if all(identifier in reserve for identifier in required):
+			descriptors = reserve
+
 	# Make sure we have all the segments we need
-	if not logical_volume_descriptor:
+	if TagIdentifier.LogicalVolumeDescriptor not in descriptors:
 		raise Exception("File is missing a Logical Volume Descriptor sector.")
 
-	if not partition_descriptor:
+	if TagIdentifier.PartitionDescriptor not in descriptors:
 		raise Exception("File is missing a Partition Descriptor sector.")
 
-	if not terminating_descriptor:
+	if TagIdentifier.TerminatingDescriptor not in descriptors:
 		raise Exception("File is missing a Terminating Descriptor sector.")
 
+	partition_descriptor = PartitionDescriptor(*descriptors[TagIdentifier.PartitionDescriptor], validation = validation)
+	start = partition_descriptor.partition_starting_location * sector_size
+	length = partition_descriptor.partition_length * sector_size
+	context.physical_partitions[partition_descriptor.partition_number] = PhysicalPartition(file, start, length)
+	logical_volume_descriptor = LogicalVolumeDescriptor(*descriptors[TagIdentifier.LogicalVolumeDescriptor], validation = validation)
+
 	# Get all the logical partitions
 	for i in range(len(logical_volume_descriptor.partition_maps)):
 		context.logical_partitions.append(LogicalPartition.from_descriptor(context, logical_volume_descriptor, i))
@@ -947,15 +1395,21 @@ def read_udf_file(file_name):
 
 	tag = None
 	try:
-		tag = DescriptorTag(fsd_buffer)
+		tag = DescriptorTag(fsd_buffer, 0, validation)
 	except:
 		raise Exception("Failed to get Descriptor Tag from Partition Extent.")
 
 	# Get the root file information from the extent
-	file_set_descriptor = FileSetDescriptor(fsd_buffer)
+	file_set_descriptor = FileSetDescriptor(fsd_buffer, 0, validation)
 	root_directory = File.from_descriptor(context, file_set_descriptor.root_directory_icb)
 	return root_directory
 
 
-
-
+def open_udf(file_name, use_mmap = False, file = None, validation = None):
+	"""Mounts a UDF image and returns a UdfFileSystem (close it, or use it with 'with').
+	use_mmap maps a local image instead of reading it; I/O errors then arrive as signals
+	rather than exceptions, so it is meant for local disks, not network shares.
+	file is an already open image to share; closing the UdfFileSystem leaves it open.
+	validation is the level (VALIDATION_*) for this mount only, None for the module default"""
+	root = read_udf_file(file_name, use_mmap, file, validation)
+	return UdfFileSystem(root)
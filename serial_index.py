@@ -0,0 +1,245 @@
+"""Компактный индекс серийных номеров PS2, собранный из JSON-баз.
+
+Все региональные базы сливаются в одну таблицу: на каждый серийник один
+ключ, а за ним - названия из всех регионов, где он встречается, в порядке
+REGION_PRECEDENCE. Первое название основное, остальные - альтернативные.
+
+Ключ - канонический вид серийника: верхний регистр без '-', '_', '.' и ';'
+(SLUS-20312, SLUS_203.12 и slus20312 дают SLUS20312).
+
+Формат файла (little-endian):
+    заголовок   magic, длина ключа, число регионов, число ключей, число названий
+    регионы     коды регионов по 4 байта (b'US\\0\\0')
+    ключи       отсортированные канонические серийники, добитые нулями
+    записи      номер первого названия и число названий для каждого ключа
+    названия    смещение и длина в блоке текста, номер региона
+    текст       UTF-8 строки подряд
+
+Файл открывается через mmap только для чтения, поэтому рабочие процессы
+делят одни и те же страницы в кэше ОС, а поиск - бинарный по ключам.
+
+Сборка индекса (конфликты между базами выводятся при сборке):
+    python serial_index.py
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from bisect import bisect_left
+from collections import namedtuple
+from pathlib import Path
+
+from config import DATABASE_FILES, INDEX_FILE_NAME, REGION_PRECEDENCE
+
+MAGIC = b'PS2SIDX2'
+HEADER = struct.Struct('<8sHHII')
+REGION = struct.Struct('<4s')
+RECORD = struct.Struct('<IB')
+TITLE = struct.Struct('<IHB')
+
+# Символы, которые отбрасываются при приведении серийника к ключу
+SERIAL_SEPARATORS = b'-_.; '
+
+logger = logging.getLogger(__name__)
+
+SerialInfo = namedtuple('SerialInfo', ['title', 'region', 'alternates'])
+
+
+def canonical_serial(serial):
+    """SLUS_203.12 / SLUS-20312 / slus20312 -> b'SLUS20312'"""
+    if isinstance(serial, str):
+        serial = serial.encode('utf-8')
+    return serial.upper().translate(None, SERIAL_SEPARATORS)
+
+
+def region_from_file_name(db_file):
+    """db_playstation2_official_us.json -> US"""
+    return Path(db_file).stem.split('_')[-1].upper()
+
+
+def _region_order(region):
+    if region in REGION_PRECEDENCE:
+        return REGION_PRECEDENCE.index(region)
+    return len(REGION_PRECEDENCE)
+
+
+def compile_index(db_paths):
+    """Собирает индекс из JSON-баз.
+
+    Возвращает пару (данные индекса, список конфликтов). Конфликт - это
+    один серийник с разными названиями в разных базах либо разные
+    серийники, совпавшие после приведения к ключу.
+    """
+    db_paths = sorted(db_paths, key=lambda path: _region_order(region_from_file_name(path)))
+    regions = [region_from_file_name(path) for path in db_paths]
+
+    entries = {}
+    for region_index, db_path in enumerate(db_paths):
+        with open(db_path, 'rb') as f:
+            db = json.loads(f.read().decode('utf8'))
+        for serial, title in db.items():
+            entries.setdefault(canonical_serial(serial), []).append((region_index, serial, title))
+
+    conflicts = []
+    for key, found in entries.items():
+        if len({serial for _, serial, _ in found}) > 1:
+            conflicts.append("{0}: разные серийники {1}".format(
+                key.decode('utf-8'), ', '.join(serial for _, serial, _ in found)))
+        elif len({title for _, _, title in found}) > 1:
+            conflicts.append("{0}: {1}".format(found[0][1], '; '.join(
+                '{0}="{1}"'.format(regions[region_index], title) for region_index, _, title in found)))
+
+    keys = sorted(entries)
+    key_size = max(map(len, keys), default=1)
+
+    records = []
+    titles = []
+    text = []
+    offset = 0
+    for key in keys:
+        records.append(RECORD.pack(len(titles), len(entries[key])))
+        for region_index, _, title in entries[key]:
+            title = title.encode('utf-8')
+            titles.append(TITLE.pack(offset, len(title), region_index))
+            text.append(title)
+            offset += len(title)
+
+    data = b''.join([
+        HEADER.pack(MAGIC, key_size, len(regions), len(keys), len(titles)),
+        b''.join(REGION.pack(region.encode('ascii')) for region in regions),
+        b''.join(key.ljust(key_size, b'\0') for key in keys),
+        b''.join(records),
+        b''.join(titles),
+        b''.join(text),
+    ])
+    return data, conflicts
+
+
+def write_index(db_paths, index_path):
+    """Собирает индекс, атомарно записывает его в index_path и возвращает конфликты"""
+    data, conflicts = compile_index(db_paths)
+    for conflict in conflicts:
+        logger.warning("Конфликт баз данных: %s", conflict)
+
+    tmp_path = '{0}.tmp{1}'.format(index_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, index_path)
+    return conflicts
+
+
+class _Keys(object):
+    """Последовательность ключей поверх буфера, чтобы работал bisect"""
+
+    def __init__(self, buffer, offset, count, key_size):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+        self._key_size = key_size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        start = self._offset + index * self._key_size
+        return self._buffer[start:start + self._key_size]
+
+
+class SerialIndex(object):
+    def __init__(self, buffer):
+        self._buffer = buffer
+        magic, key_size, region_count, count, title_count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Неверный формат индекса серийных номеров")
+
+        offset = HEADER.size
+        self.regions = [
+            REGION.unpack_from(buffer, offset + i * REGION.size)[0].rstrip(b'\0').decode('ascii')
+            for i in range(region_count)
+        ]
+        offset += region_count * REGION.size
+
+        self._key_size = key_size
+        self._keys = _Keys(buffer, offset, count, key_size)
+        self._records_offset = offset + count * key_size
+        self._titles_offset = self._records_offset + count * RECORD.size
+        self._text_offset = self._titles_offset + title_count * TITLE.size
+
+    @classmethod
+    def from_file(cls, index_path):
+        with open(index_path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _title(self, index):
+        offset, length, region = TITLE.unpack_from(self._buffer, self._titles_offset + index * TITLE.size)
+        start = self._text_offset + offset
+        return self.regions[region], self._buffer[start:start + length].decode('utf-8')
+
+    def lookup(self, serial):
+        """Возвращает SerialInfo(название, регион, альтернативы) или None.
+
+        alternates - кортеж пар (регион, название) из остальных баз.
+        """
+        key = canonical_serial(serial)
+        if len(key) > self._key_size:
+            return None
+
+        key = key.ljust(self._key_size, b'\0')
+        i = bisect_left(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            return None
+
+        first, count = RECORD.unpack_from(self._buffer, self._records_offset + i * RECORD.size)
+        region, title = self._title(first)
+        alternates = tuple(self._title(first + n) for n in range(1, count))
+        return SerialInfo(title, region, alternates)
+
+
+def database_fingerprint(paths):
+    """Строка, меняющаяся при изменении любого из файлов баз или индекса"""
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        parts.append('{0}:{1}:{2}'.format(os.path.basename(path), st.st_size, st.st_mtime_ns))
+    return ';'.join(parts)
+
+
+def load_index(index_path, db_paths):
+    """Открывает индекс, пересобирая его, если JSON-базы новее или формат устарел.
+
+    Если каталог недоступен для записи, индекс собирается в памяти.
+    """
+    sources = [path for path in db_paths if os.path.exists(path)]
+    try:
+        index_mtime = os.stat(index_path).st_mtime_ns
+        if all(os.stat(path).st_mtime_ns <= index_mtime for path in sources):
+            return SerialIndex.from_file(index_path)
+    except (OSError, ValueError):
+        pass
+
+    if not sources:
+        raise Exception("Не найдены ни индекс, ни базы данных: {0}".format(index_path))
+
+    try:
+        write_index(sources, index_path)
+        return SerialIndex.from_file(index_path)
+    except OSError:
+        return SerialIndex(compile_index(sources)[0])
+
+
+if __name__ == '__main__':
+    base_path = os.path.abspath(os.path.dirname(__file__))
+    index_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(base_path, INDEX_FILE_NAME)
+    logging.basicConfig(format='%(message)s')
+    conflicts = write_index([os.path.join(base_path, db_file) for db_file in DATABASE_FILES], index_path)
+    index = SerialIndex.from_file(index_path)
+    print("{0}: {1} серийных номеров, регионы: {2}, конфликтов: {3}".format(
+        index_path, len(index), ', '.join(index.regions), len(conflicts)))
@@ -0,0 +1,678 @@
+"""Генератор синтетических образов дисков PS2 для замеров и отладки.
+
+Создает ISO9660 или мостовой ISO9660+UDF (1.02) образ с заданными размером,
+глубиной каталогов, числом файлов, содержимым SYSTEM.CNF и положением
+серийного номера в «сырых» данных. Образ пишется разреженным файлом:
+записываются только служебные структуры и содержимое маленьких файлов,
+поэтому многогигабайтный образ почти не занимает места на диске.
+
+Пример:
+    python synthetic_disc.py out.iso --size 4G --udf --files 500 --depth 4
+"""
+import argparse
+import os
+import struct
+
+import disc_io
+import identify_playstation2_games as ps2
+
+SECTOR_SIZE = 2048
+# Сырой образ MODE2/2352: синхропоследовательность, заголовок и подзаголовок XA
+RAW_SECTOR_SIZE = 2352
+RAW_DATA_OFFSET = 24
+RAW_SYNC = b'\x00' + b'\xff' * 10 + b'\x00'
+SYSTEM_AREA_SECTORS = 16
+ANCHOR_SECTOR = 256
+PARTITION_START = 257
+
+# Положение ISO-структур и UDF Volume Descriptor Sequence
+PATH_TABLE_SECTOR = 21
+MAIN_VDS_SECTOR = 32
+RESERVE_VDS_SECTOR = 48
+INTEGRITY_SECTOR = 64
+
+DEFAULT_SERIAL = 'SLUS_203.12'
+DEFAULT_SYSTEM_CNF = 'BOOT2 = cdrom0:\\{0};1\r\nVER = 1.00\r\nVMODE = NTSC\r\n'
+
+# Дата записи всех структур: 2004-01-01 00:00:00 UTC
+ISO_DIR_DATETIME = bytes([104, 1, 1, 0, 0, 0, 0])
+ISO_VD_DATETIME = b'2004010100000000\x00'
+UDF_TIMESTAMP = struct.pack('<HHBBBBBBBB', 0x1000, 2004, 1, 1, 0, 0, 0, 0, 0, 0)
+
+
+def parse_size(value):
+    """4G / 700M / 64K / 12345 -> байты"""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    value = str(value).strip().upper()
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def _raw_header(sector):
+    """Заголовок сырого сектора MODE2 Form 1 (EDC/ECC не заполняются)"""
+    minutes, rest = divmod(sector + 150, 75 * 60)
+    seconds, frame = divmod(rest, 75)
+    bcd = lambda value: (value // 10) << 4 | value % 10
+    return RAW_SYNC + bytes([bcd(minutes), bcd(seconds), bcd(frame), 2]) + b'\x00\x00\x08\x00' * 2
+
+
+def _write_at(f, offset, data, raw):
+    """Пишет data по логическому смещению; в сыром образе - посекторно"""
+    if not raw:
+        f.seek(offset)
+        f.write(data)
+        return
+
+    pos = 0
+    while pos < len(data):
+        sector, within = divmod(offset + pos, SECTOR_SIZE)
+        chunk = data[pos:pos + SECTOR_SIZE - within]
+        f.seek(sector * RAW_SECTOR_SIZE)
+        f.write(_raw_header(sector))
+        f.seek(sector * RAW_SECTOR_SIZE + RAW_DATA_OFFSET + within)
+        f.write(chunk)
+        pos += len(chunk)
+
+
+def _sectors(length):
+    return max(1, (length + SECTOR_SIZE - 1) // SECTOR_SIZE)
+
+
+##
+## Общие кодировщики
+##
+
+def _both16(value):
+    return struct.pack('<H', value) + struct.pack('>H', value)
+
+
+def _both32(value):
+    return struct.pack('<I', value) + struct.pack('>I', value)
+
+
+def _crc16(data):
+    """CRC-16/CCITT (x^16 + x^12 + x^5 + 1) для тегов UDF"""
+    crc = 0
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return crc
+
+
+def _udf_tag(identifier, body, location, version=2):
+    """Собирает дескриптор UDF: 16 байт тега + тело с корректными checksum и CRC"""
+    crc = _crc16(body)
+    tag = bytearray(struct.pack('<HHBBHHHI', identifier, version, 0, 0, 0, crc, len(body), location))
+    tag[4] = (sum(tag[0:4]) + sum(tag[5:16])) & 0xFF
+    return bytes(tag) + body
+
+
+def _regid(identifier, suffix=b''):
+    return struct.pack('<B23s8s', 0, identifier, suffix)
+
+
+def _charspec():
+    return struct.pack('<B63s', 0, b'OSTA Compressed Unicode')
+
+
+def _dstring(text, length):
+    data = b'\x08' + text.encode('latin-1') if text else b''
+    return data.ljust(length - 1, b'\0') + bytes([len(data)])
+
+
+def _lb_addr(block, partition=0):
+    return struct.pack('<IH', block, partition)
+
+
+def _long_ad(length, block, partition=0):
+    return struct.pack('<I', length) + _lb_addr(block, partition) + b'\0' * 6
+
+
+def _short_ad(length, block):
+    return struct.pack('<II', length, block)
+
+
+# Наибольшая длина одного экстента UDF (30 бит), кратная размеру блока
+MAX_EXTENT_LENGTH = 0x3FFFF800
+
+
+def _short_ads(length, block, long=False):
+    """Дескрипторы размещения для непрерывного файла; больше 1 ГБ - несколько экстентов"""
+    out = b''
+    while length > 0:
+        chunk = min(length, MAX_EXTENT_LENGTH)
+        out += _long_ad(chunk, block) if long else _short_ad(chunk, block)
+        block += chunk // SECTOR_SIZE
+        length -= chunk
+    return out
+
+
+# Способы размещения содержимого в UDF (поле flags тега ICB и вид дескрипторов)
+UDF_ALLOCATIONS = ('short', 'long', 'embedded', 'chained')
+AD_SHORT, AD_LONG, AD_EMBEDDED = 0, 1, 3
+# Размер заголовка File Entry и Extended File Entry до дескрипторов размещения
+FILE_ENTRY_HEADER = 176
+EXTENDED_FILE_ENTRY_HEADER = 216
+
+
+##
+## Модель дерева
+##
+
+class _Node(object):
+    def __init__(self, name, parent=None, data=b'', size=0):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.is_dir = size is None
+        self.data = data
+        self.size = len(data) if data else (size or 0)
+
+        self.iso_extent = 0         # сектор ISO-каталога или данных файла
+        self.iso_length = 0
+        self.udf_entry = None       # сектор FileEntry
+        self.udf_fids = None        # сектор идентификаторов каталога
+        self.udf_fids_length = 0
+        self.udf_aed = None         # сектор Allocation Extent Descriptor (chained)
+        self.path_number = None     # номер в таблице путей
+
+        if parent is not None:
+            parent.children.append(self)
+
+    def iter_dirs(self):
+        """Каталоги в порядке таблицы путей: по уровням, внутри - по имени"""
+        level = [self]
+        while level:
+            for node in level:
+                yield node
+            level = [child for node in level for child in sorted(node.children, key=lambda c: c.name) if child.is_dir]
+
+    def iter_files(self):
+        for node in self.iter_dirs():
+            for child in sorted(node.children, key=lambda c: c.name):
+                if not child.is_dir:
+                    yield child
+
+
+def _build_tree(files, depth, file_size, system_cnf, boot_file, data_dir='DATA'):
+    root = _Node('', size=None)
+    if system_cnf is not None:
+        _Node('SYSTEM.CNF', root, data=system_cnf)
+    if boot_file:
+        _Node(boot_file, root, data=b'\x7fELF' + b'\0' * 1020)
+
+    # Цепочка вложенных каталогов DATA/L1/L2/... глубиной depth
+    dirs = [root]
+    parent = root
+    for level in range(depth):
+        parent = _Node(data_dir if level == 0 else 'L{0}'.format(level), parent, size=None)
+        dirs.append(parent)
+
+    # Файлы раскладываются по каталогам по кругу
+    for index in range(files):
+        _Node('F{0:05d}.BIN'.format(index), dirs[index % len(dirs)], size=file_size)
+
+    return root
+
+
+##
+## Раскладка и запись
+##
+
+def _iso_record(node, name, extent, length):
+    flags = 2 if node.is_dir else 0
+    identifier = name
+    pad = b'\0' if len(identifier) % 2 == 0 else b''
+    body = (_both32(extent) + _both32(length) + ISO_DIR_DATETIME + bytes([flags, 0, 0])
+            + _both16(1) + bytes([len(identifier)]) + identifier + pad)
+    return bytes([len(body) + 2, 0]) + body
+
+
+def _iso_name(node):
+    return node.name.encode('ascii') + (b'' if node.is_dir else b';1')
+
+
+def _iso_directory(node):
+    records = [
+        _iso_record(node, b'\x00', node.iso_extent, node.iso_length),
+        _iso_record(node.parent or node, b'\x01', (node.parent or node).iso_extent, (node.parent or node).iso_length),
+    ]
+    for child in sorted(node.children, key=lambda c: c.name):
+        records.append(_iso_record(child, _iso_name(child), child.iso_extent, child.iso_length))
+
+    # Записи не должны пересекать границу сектора
+    out = bytearray()
+    for record in records:
+        if len(out) // SECTOR_SIZE != (len(out) + len(record) - 1) // SECTOR_SIZE:
+            out.extend(b'\0' * (SECTOR_SIZE - len(out) % SECTOR_SIZE))
+        out.extend(record)
+    return bytes(out)
+
+
+def _iso_path_table(dirs, big_endian):
+    fmt = '>IH' if big_endian else '<IH'
+    out = bytearray()
+    for node in dirs:
+        name = node.name.encode('ascii') or b'\x00'
+        parent = node.parent.path_number if node.parent else 1
+        out += bytes([len(name), 0]) + struct.pack(fmt, node.iso_extent, parent) + name
+        if len(name) % 2:
+            out += b'\0'
+    return bytes(out)
+
+
+def _iso_pvd(total_sectors, path_table_size, path_table_sectors, root):
+    return b''.join([
+        b'\x01CD001\x01\x00',
+        b'PLAYSTATION'.ljust(32),
+        b'SYNTHETIC_PS2'.ljust(32),
+        b'\0' * 8,
+        _both32(total_sectors),
+        b'\0' * 32,
+        _both16(1), _both16(1), _both16(SECTOR_SIZE),
+        _both32(path_table_size),
+        struct.pack('<I', PATH_TABLE_SECTOR), struct.pack('<I', 0),
+        struct.pack('>I', PATH_TABLE_SECTOR + path_table_sectors), struct.pack('>I', 0),
+        _iso_record(root, b'\x00', root.iso_extent, root.iso_length),
+        b' ' * 128 * 4,
+        b' ' * (37 * 3),
+        ISO_VD_DATETIME * 4,
+        b'\x01\x00',
+    ]).ljust(SECTOR_SIZE, b'\0')
+
+
+def _embeddable(node, extended):
+    """Помещается ли содержимое файла прямо в его File Entry"""
+    header = EXTENDED_FILE_ENTRY_HEADER if extended else FILE_ENTRY_HEADER
+    return not node.is_dir and len(node.data) == node.size and header + node.size <= SECTOR_SIZE
+
+
+def _udf_file_entry(node, location, unique_id, parent_block, allocation='short', extended=False):
+    """File Entry (или Extended File Entry) узла; allocation - один из UDF_ALLOCATIONS.
+
+    embedded кладет содержимое маленьких файлов в сам File Entry, chained
+    оставляет в нем первый экстент и ссылку на Allocation Extent Descriptor
+    в секторе node.udf_aed с остальными; прочие узлы получают short.
+    """
+    if node.is_dir:
+        length, block = node.udf_fids_length, node.udf_fids - PARTITION_START
+    else:
+        length, block = node.size, node.iso_extent - PARTITION_START
+
+    ad_type = AD_LONG if allocation == 'long' else AD_SHORT
+    if allocation == 'embedded' and _embeddable(node, extended):
+        ad_type = AD_EMBEDDED
+        descriptors = node.data
+    elif allocation == 'chained' and node.udf_aed:
+        descriptors = _short_ad(SECTOR_SIZE, block) \
+            + _short_ad((3 << 30) | SECTOR_SIZE, node.udf_aed - PARTITION_START)
+    else:
+        descriptors = _short_ads(length, block, long=allocation == 'long')
+
+    icb_tag = struct.pack('<IHHHBB', 0, 4, 0, 1, 0, 4 if node.is_dir else 5) + _lb_addr(parent_block) \
+        + struct.pack('<H', ad_type)
+    link_count = 1 + sum(1 for child in node.children if child.is_dir) if node.is_dir else 1
+    recorded = struct.pack('<Q', _sectors(length) if length and ad_type != AD_EMBEDDED else 0)
+    if extended:
+        # ECMA-167 4/14.17: добавлены размер объекта, время создания и поток
+        middle = [
+            struct.pack('<QQ', length, length), recorded,
+            UDF_TIMESTAMP * 4,
+            struct.pack('<II', 1, 0),
+            _long_ad(0, 0), _long_ad(0, 0),
+        ]
+    else:
+        middle = [
+            struct.pack('<Q', length), recorded,
+            UDF_TIMESTAMP * 3,
+            struct.pack('<I', 1),
+            _long_ad(0, 0),
+        ]
+    body = b''.join([
+        icb_tag,
+        struct.pack('<III', 0xFFFFFFFF, 0xFFFFFFFF, 0x1084 | 0x4210 if node.is_dir else 0x0084 | 0x4210),
+        struct.pack('<HBBI', link_count, 0, 0, 0),
+    ] + middle + [
+        _regid(b'*SYNTHETIC PS2'),
+        struct.pack('<QII', unique_id, 0, len(descriptors)),
+        descriptors,
+    ])
+    return _udf_tag(266 if extended else 261, body, location)
+
+
+def _udf_allocation_extent(node, location):
+    """Allocation Extent Descriptor с экстентами файла после первого сектора"""
+    block = node.iso_extent - PARTITION_START
+    descriptors = _short_ads(node.size - SECTOR_SIZE, block + 1)
+    return _udf_tag(258, struct.pack('<II', 0, len(descriptors)) + descriptors, location)
+
+
+def _udf_fid(characteristics, name, entry_block, location):
+    identifier = (b'\x08' + name.encode('latin-1')) if name else b''
+    body = struct.pack('<HBB', 1, characteristics, len(identifier)) + _long_ad(SECTOR_SIZE, entry_block) \
+        + struct.pack('<H', 0) + identifier
+    padding = (4 - (16 + len(body)) % 4) % 4
+    return _udf_tag(257, body + b'\0' * padding, location)
+
+
+def _udf_directory(node):
+    parent = node.parent or node
+    fids = bytearray()
+
+    def add(characteristics, name, entry):
+        location = node.udf_fids - PARTITION_START + len(fids) // SECTOR_SIZE
+        fids.extend(_udf_fid(characteristics, name, entry - PARTITION_START, location))
+
+    add(0x0A, '', parent.udf_entry)
+    for child in sorted(node.children, key=lambda c: c.name):
+        add(0x02 if child.is_dir else 0x00, child.name, child.udf_entry)
+    return bytes(fids)
+
+
+def _udf_volume_descriptors(total_sectors, partition_length, root_entry):
+    partition_regid = _regid(b'+NSR02')
+    domain = _regid(b'*OSTA UDF Compliant', struct.pack('<H', 0x0102))
+    pvd = _udf_tag(1, b''.join([
+        struct.pack('<II', 0, 0),
+        _dstring('SYNTHETIC_PS2', 32),
+        struct.pack('<HHHHII', 1, 1, 2, 2, 1, 1),
+        _dstring('SYNTHETIC_PS2', 128),
+        _charspec(), _charspec(),
+        b'\0' * 16,
+        _regid(b''),
+        UDF_TIMESTAMP,
+        _regid(b'*SYNTHETIC PS2'),
+        b'\0' * 64,
+        struct.pack('<IH', 0, 0),
+        b'\0' * 22,
+    ]), 0)
+    pd = _udf_tag(5, b''.join([
+        struct.pack('<IHH', 1, 1, 0),
+        partition_regid,
+        b'\0' * 128,
+        struct.pack('<III', 1, PARTITION_START, partition_length),
+        _regid(b'*SYNTHETIC PS2'),
+        b'\0' * 128,
+        b'\0' * 156,
+    ]), 0)
+    lvd = _udf_tag(6, b''.join([
+        struct.pack('<I', 2),
+        _charspec(),
+        _dstring('SYNTHETIC_PS2', 128),
+        struct.pack('<I', SECTOR_SIZE),
+        domain,
+        _long_ad(SECTOR_SIZE, 0),
+        struct.pack('<II', 6, 1),
+        _regid(b'*SYNTHETIC PS2'),
+        b'\0' * 128,
+        struct.pack('<II', 2 * SECTOR_SIZE, INTEGRITY_SECTOR),
+        struct.pack('<BBHH', 1, 6, 1, 0),
+    ]), 0)
+    usd = _udf_tag(7, struct.pack('<II', 3, 0), 0)
+    td = _udf_tag(8, b'\0' * 496, 0)
+    return [pvd, pd, lvd, usd, td]
+
+
+def _relocate(descriptor, location):
+    """Копия дескриптора с другим полем TagLocation"""
+    return _udf_tag(struct.unpack_from('<H', descriptor)[0], descriptor[16:], location)
+
+
+class _ReadRecorder(object):
+    """Образ, запоминающий диапазоны [start, end) позиционных чтений"""
+
+    def __init__(self, f, reads):
+        self._f = f
+        self._reads = reads
+        self.size = disc_io.get_size(f)
+
+    def pread(self, length, offset):
+        data = disc_io.pread(self._f, length, offset)
+        self._reads.append((offset, offset + len(data)))
+        return data
+
+
+def probe_read_boundary(path, after):
+    """Первое смещение не раньше after, на котором поиск в сырых данных
+    (окна PROBE_WINDOWS, без полного поиска) заканчивает одно чтение и
+    продолжает со следующего. Серийник поперек такой границы находится только
+    благодаря переносу хвоста между чтениями.
+    """
+    reads = []
+    with disc_io.open_image(path) as f:
+        ps2._probe_binary(_ReadRecorder(f, reads))
+    for (_, end), (next_start, next_end) in zip(reads, reads[1:]):
+        if next_start <= end < next_end and end >= after:
+            return end
+    raise ValueError("Поиск не читает образ через границу после смещения {0}".format(after))
+
+
+def write_image(path, size=0, files=0, depth=1, file_size=64 * 1024, udf=False,
+                serial=DEFAULT_SERIAL, system_cnf=True, boot_file=True,
+                serial_at=None, serial_text=None, raw=False, cue=True,
+                udf_allocation='short', udf_extended=False, data_dir='DATA'):
+    """Записывает синтетический образ и возвращает словарь с его параметрами.
+
+    system_cnf: True - стандартный SYSTEM.CNF с BOOT2 на serial, bytes/str -
+    свое содержимое, None/False - без SYSTEM.CNF.
+    boot_file: True - загрузочный ELF с именем serial в корне (его запись
+    каталога содержит серийник в начале образа), False - без него.
+    serial_at: куда записать serial_text в сырые данные - 'start', 'middle',
+    'end', 'boundary' (поперек границы двух чтений поиска в сырых данных,
+    см. probe_read_boundary) или смещение в байтах; None - никуда.
+    raw: записать сырой образ MODE2/2352 (смещения и size остаются
+    логическими), cue - и .cue рядом с ним.
+    udf_allocation: размещение файлов в UDF (см. UDF_ALLOCATIONS),
+    udf_extended: Extended File Entry вместо File Entry.
+    data_dir: имя каталога первого уровня (регистр записывается как есть).
+    """
+    if udf_allocation not in UDF_ALLOCATIONS:
+        raise ValueError("Неизвестное размещение UDF: {0}".format(udf_allocation))
+    if system_cnf is True:
+        system_cnf = DEFAULT_SYSTEM_CNF.format(serial).encode('ascii')
+    elif isinstance(system_cnf, str):
+        system_cnf = system_cnf.encode('ascii')
+    elif not system_cnf:
+        system_cnf = None
+    if boot_file is True:
+        boot_file = serial
+    serial_text = (serial_text or serial + ';1').encode('ascii')
+
+    root = _build_tree(files, depth, file_size, system_cnf, boot_file or None, data_dir)
+    dirs = list(root.iter_dirs())
+    file_nodes = list(root.iter_files())
+    for number, node in enumerate(dirs, 1):
+        node.path_number = number
+
+    # Раскладка области данных: FSD и его терминатор, затем каталоги, затем файлы
+    next_sector = PARTITION_START + 2
+    for node in dirs:
+        node.udf_entry = next_sector
+        next_sector += 1
+        node.iso_extent = next_sector
+        node.iso_length = 0
+    for node in file_nodes:
+        node.udf_entry = next_sector
+        next_sector += 1
+        # Для chained у файлов длиннее сектора - еще и сектор продолжения
+        if udf and udf_allocation == 'chained' and node.size > SECTOR_SIZE:
+            node.udf_aed = next_sector
+            next_sector += 1
+
+    # Размер каталогов зависит только от имен, поэтому считаем его заранее
+    for node in dirs:
+        node.iso_length = _sectors(len(_iso_directory(node))) * SECTOR_SIZE
+    for node in dirs:
+        node.iso_extent = next_sector
+        next_sector += node.iso_length // SECTOR_SIZE
+        if udf:
+            node.udf_fids = next_sector
+            node.udf_fids_length = len(_udf_directory(node))
+            next_sector += _sectors(node.udf_fids_length)
+    for node in file_nodes:
+        node.iso_extent = next_sector
+        node.iso_length = node.size
+        next_sector += _sectors(node.size)
+
+    used_end = next_sector * SECTOR_SIZE
+    total_sectors = max(next_sector + (1 if udf else 0), _sectors(size))
+    image_size = total_sectors * SECTOR_SIZE
+
+    path_table_l = _iso_path_table(dirs, False)
+    path_table_m = _iso_path_table(dirs, True)
+    path_table_sectors = _sectors(len(path_table_l))
+    if PATH_TABLE_SECTOR + 2 * path_table_sectors > MAIN_VDS_SECTOR:
+        raise ValueError("Слишком много каталогов для таблицы путей")
+
+    writes = [
+        (16, _iso_pvd(total_sectors, len(path_table_l), path_table_sectors, root)),
+        (17, b'\xffCD001\x01'.ljust(SECTOR_SIZE, b'\0')),
+        (PATH_TABLE_SECTOR, path_table_l),
+        (PATH_TABLE_SECTOR + path_table_sectors, path_table_m),
+    ]
+    for node in dirs:
+        writes.append((node.iso_extent, _iso_directory(node)))
+    for node in file_nodes:
+        if node.data:
+            writes.append((node.iso_extent, node.data))
+
+    if udf:
+        partition_length = total_sectors - 1 - PARTITION_START
+        writes += [
+            (18, b'\x00BEA01\x01'.ljust(SECTOR_SIZE, b'\0')),
+            (19, b'\x00NSR02\x01'.ljust(SECTOR_SIZE, b'\0')),
+            (20, b'\x00TEA01\x01'.ljust(SECTOR_SIZE, b'\0')),
+        ]
+        for base in (MAIN_VDS_SECTOR, RESERVE_VDS_SECTOR):
+            for offset, descriptor in enumerate(_udf_volume_descriptors(total_sectors, partition_length, root.udf_entry)):
+                writes.append((base + offset, _relocate(descriptor, base + offset)))
+
+        lvid = _udf_tag(9, b''.join([
+            UDF_TIMESTAMP,
+            struct.pack('<I', 1),
+            b'\0' * 8,
+            struct.pack('<Q', 16 + len(file_nodes) + len(dirs)) + b'\0' * 24,
+            struct.pack('<II', 1, 46),
+            struct.pack('<I', 0), struct.pack('<I', partition_length),
+            _regid(b'*SYNTHETIC PS2'),
+            struct.pack('<IIHHH', len(file_nodes), len(dirs), 0x0102, 0x0102, 0x0102),
+        ]), INTEGRITY_SECTOR)
+        writes.append((INTEGRITY_SECTOR, lvid))
+        writes.append((INTEGRITY_SECTOR + 1, _udf_tag(8, b'\0' * 496, INTEGRITY_SECTOR + 1)))
+
+        anchor = struct.pack('<IIII', 16 * SECTOR_SIZE, MAIN_VDS_SECTOR, 16 * SECTOR_SIZE, RESERVE_VDS_SECTOR) + b'\0' * 480
+        writes.append((ANCHOR_SECTOR, _udf_tag(2, anchor, ANCHOR_SECTOR)))
+        writes.append((total_sectors - 1, _udf_tag(2, anchor, total_sectors - 1)))
+
+        fsd = _udf_tag(256, b''.join([
+            UDF_TIMESTAMP,
+            struct.pack('<HHIIII', 3, 3, 1, 1, 0, 0),
+            _charspec(),
+            _dstring('SYNTHETIC_PS2', 128),
+            _charspec(),
+            _dstring('SYNTHETIC_PS2', 32),
+            _dstring('', 32), _dstring('', 32),
+            _long_ad(SECTOR_SIZE, root.udf_entry - PARTITION_START),
+            _regid(b'*OSTA UDF Compliant', struct.pack('<H', 0x0102)),
+            _long_ad(0, 0),
+            _long_ad(0, 0),
+            b'\0' * 32,
+        ]), 0)
+        writes.append((PARTITION_START, fsd))
+        writes.append((PARTITION_START + 1, _udf_tag(8, b'\0' * 496, 1)))
+
+        unique_id = 16
+        for node in dirs + file_nodes:
+            parent_block = (node.parent or node).udf_entry - PARTITION_START
+            block = node.udf_entry - PARTITION_START
+            writes.append((node.udf_entry, _udf_file_entry(
+                node, block, 0 if node is root else unique_id, parent_block, udf_allocation, udf_extended)))
+            unique_id += 1
+            if node.udf_aed:
+                writes.append((node.udf_aed, _udf_allocation_extent(node, node.udf_aed - PARTITION_START)))
+        for node in dirs:
+            writes.append((node.udf_fids, _udf_directory(node)))
+
+    # Положение серийника в сырых данных
+    serial_offset = None
+    if serial_at is not None and serial_at != 'boundary':
+        if serial_at == 'start':
+            serial_offset = 0
+        elif serial_at == 'middle':
+            serial_offset = image_size // 2
+        elif serial_at == 'end':
+            serial_offset = image_size - SECTOR_SIZE - len(serial_text)
+        else:
+            serial_offset = int(serial_at)
+
+    with open(path, 'wb') as f:
+        f.truncate(total_sectors * (RAW_SECTOR_SIZE if raw else SECTOR_SIZE))
+        if raw:
+            # Синхропоследовательность в начале - признак сырого образа
+            f.write(_raw_header(0))
+        for sector, data in writes:
+            _write_at(f, sector * SECTOR_SIZE, data, raw)
+
+    if raw and cue:
+        with open(os.path.splitext(path)[0] + '.cue', 'w') as f:
+            f.write('FILE "{0}" BINARY\n  TRACK 01 MODE2/2352\n    INDEX 01 00:00:00\n'.format(os.path.basename(path)))
+
+    # Границы чтений зависят от уже записанной разметки образа
+    if serial_at == 'boundary':
+        half = len(serial_text) // 2
+        serial_offset = probe_read_boundary(path, used_end + half) - half
+
+    if serial_offset is not None:
+        if serial_offset >= SYSTEM_AREA_SECTORS * SECTOR_SIZE and serial_offset < used_end:
+            raise ValueError("Серийник попадает на служебные структуры образа")
+        if serial_offset + len(serial_text) > image_size - (SECTOR_SIZE if udf else 0):
+            raise ValueError("Серийник не помещается в образ")
+        with open(path, 'r+b') as f:
+            _write_at(f, serial_offset, serial_text, raw)
+
+    return {
+        'path': path,
+        'size': image_size,
+        'udf': udf,
+        'raw': raw,
+        'files': len(file_nodes),
+        'dirs': len(dirs),
+        'serial': serial,
+        'serial_offset': serial_offset,
+        'metadata_end': used_end,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--size', type=parse_size, default=0, help='размер образа: 700M, 4G, ...')
+    parser.add_argument('--files', type=int, default=16)
+    parser.add_argument('--depth', type=int, default=1)
+    parser.add_argument('--file-size', type=parse_size, default=64 * 1024)
+    parser.add_argument('--udf', action='store_true', help='мостовой ISO9660+UDF образ')
+    parser.add_argument('--serial', default=DEFAULT_SERIAL)
+    parser.add_argument('--no-system-cnf', dest='system_cnf', action='store_false')
+    parser.add_argument('--no-boot-file', dest='boot_file', action='store_false')
+    parser.add_argument('--serial-at', default=None, help="start, middle, end, boundary или смещение")
+    parser.add_argument('--raw', action='store_true', help='сырой образ MODE2/2352 с .cue')
+    parser.add_argument('--udf-allocation', choices=UDF_ALLOCATIONS, default='short',
+                        help='дескрипторы размещения файлов UDF')
+    parser.add_argument('--udf-extended', action='store_true', help='Extended File Entry вместо File Entry')
+    parser.add_argument('--data-dir', default='DATA', help='имя каталога первого уровня, например Data')
+    args = parser.parse_args()
+
+    info = write_image(args.path, size=args.size, files=args.files, depth=args.depth,
+                       file_size=args.file_size, udf=args.udf, serial=args.serial,
+                       system_cnf=args.system_cnf, boot_file=args.boot_file, serial_at=args.serial_at,
+                       raw=args.raw, udf_allocation=args.udf_allocation, udf_extended=args.udf_extended,
+                       data_dir=args.data_dir)
+    for key, value in info.items():
+        print('{0}: {1}'.format(key, value))
+
+
+if __name__ == '__main__':
+    main()